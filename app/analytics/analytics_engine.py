@@ -1,24 +1,36 @@
 """Analytics calculation and aggregation engine."""
 
-from typing import Dict, Any, List, Optional
-from datetime import datetime, date, timedelta
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, func, case
-import numpy as np
+from typing import Dict, Any, List, Callable, Awaitable
+from datetime import datetime, date, time, timedelta
+import asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy import select, and_, or_, func, cast, literal_column, true, Date, DateTime
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 import structlog
 
-from app.models.progress import Progress, ConceptProgress, ProgressStatus
-from app.models.analytics import Analytics, LearningMetrics, ProgressSnapshot
-from app.models.gamification import Points, PointHistory, Streak
+from app.core.cache import get_cached, set_cached, student_cache_key
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.progress import ConceptProgress, ProgressStatus
+from app.models.analytics import Analytics, LearningMetrics
+from app.models.gamification import PointHistory
 
 logger = structlog.get_logger()
 
+# date_trunc unit and generate_series step for each analytics period
+PERIOD_BUCKETS = {
+    "daily": ("day", "1 day"),
+    "weekly": ("week", "1 week"),
+    "monthly": ("month", "1 month"),
+}
+
 
 class AnalyticsEngine:
     """Engine for calculating and aggregating analytics."""
     
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, session_factory: async_sessionmaker = AsyncSessionLocal):
         self.db = db
+        self.session_factory = session_factory
     
     async def calculate_student_analytics(
         self,
@@ -30,46 +42,170 @@ class AnalyticsEngine:
         if not target_date:
             target_date = date.today()
         
-        # Determine date range
+        # Determine date range as a half-open timestamp window
         start_date, end_date = self._get_date_range(period, target_date)
         
-        # Get concept statistics
-        concept_stats = await self._get_concept_stats(student_id, start_date, end_date)
-        
-        # Get time spent
-        time_spent = await self._calculate_time_spent(student_id, start_date, end_date)
+        cache_key = await student_cache_key("analytics", student_id, "student_analytics", period, start_date)
+        cached = await get_cached(cache_key)
+        if cached is not None:
+            return cached
         
-        # Get average score
-        avg_score = await self._calculate_average_score(student_id, start_date, end_date)
+        start_ts = datetime.combine(start_date, time.min)
+        end_ts = datetime.combine(end_date + timedelta(days=1), time.min)
         
-        # Get points earned
-        points_earned = await self._get_points_earned(student_id, start_date, end_date)
+        # Get concept, time, score, points and badge aggregates in one round-trip
+        stats = await self._get_period_stats(student_id, start_ts, end_ts)
         
-        # Get badges earned
-        badges_earned = await self._get_badges_earned(student_id, start_date, end_date)
-        
-        # Create or update analytics record
+        # Create or update analytics record, keyed like backfill by the period's first day
         analytics = await self._save_analytics(
             student_id=student_id,
             period=period,
-            period_date=target_date,
-            stats={
-                **concept_stats,
-                "time_spent": time_spent,
-                "average_score": avg_score,
-                "points_earned": points_earned,
-                "badges_earned": badges_earned
-            }
+            period_date=start_date,
+            stats=stats
         )
         
+        await set_cached(cache_key, analytics, ttl=settings.CACHE_TTL)
         return analytics
     
+    async def backfill(
+        self,
+        student_id: str,
+        period: str,
+        start: date,
+        end: date
+    ) -> List[Dict[str, Any]]:
+        """Calculate and upsert analytics for every period between start and end in one pass."""
+        from app.models.gamification import UserBadge
+        
+        trunc_unit, step = PERIOD_BUCKETS[period]
+        step_interval = literal_column(f"interval '{step}'")
+        
+        buckets = func.generate_series(
+            func.date_trunc(trunc_unit, cast(start, DateTime)),
+            cast(end, DateTime),
+            step_interval
+        ).table_valued("bucket_start").render_derived(name="buckets")
+        bucket_start = buckets.c.bucket_start
+        bucket_end = bucket_start + step_interval
+        
+        concept_progress = ConceptProgress.__table__
+        point_history = PointHistory.__table__
+        user_badges = UserBadge.__table__
+        
+        def in_bucket(column):
+            return and_(column >= bucket_start, column < bucket_end)
+        
+        concept_stats = (
+            select(
+                func.count(concept_progress.c.id).filter(
+                    in_bucket(concept_progress.c.created_at)
+                ).label("concepts_started"),
+                func.count(concept_progress.c.id).filter(
+                    and_(
+                        concept_progress.c.status == ProgressStatus.COMPLETED.value,
+                        in_bucket(concept_progress.c.completed_at)
+                    )
+                ).label("concepts_completed"),
+                func.count(concept_progress.c.id).filter(
+                    and_(
+                        concept_progress.c.status == ProgressStatus.MASTERED.value,
+                        in_bucket(concept_progress.c.mastered_at)
+                    )
+                ).label("concepts_mastered"),
+                func.coalesce(
+                    func.sum(concept_progress.c.time_spent).filter(
+                        in_bucket(concept_progress.c.last_attempted_at)
+                    ),
+                    0
+                ).label("time_spent"),
+                func.coalesce(
+                    func.avg(concept_progress.c.current_score).filter(
+                        and_(
+                            in_bucket(concept_progress.c.last_attempted_at),
+                            concept_progress.c.current_score.isnot(None)
+                        )
+                    ),
+                    0.0
+                ).label("average_score")
+            )
+            .where(concept_progress.c.student_id == student_id)
+            .lateral("concept_stats")
+        )
+        
+        points_earned = (
+            select(func.coalesce(func.sum(point_history.c.points_awarded), 0))
+            .where(
+                and_(
+                    point_history.c.student_id == student_id,
+                    in_bucket(point_history.c.awarded_at)
+                )
+            )
+            .scalar_subquery()
+        )
+        
+        badges_earned = (
+            select(func.count(user_badges.c.id))
+            .where(
+                and_(
+                    user_badges.c.student_id == student_id,
+                    in_bucket(user_badges.c.earned_at)
+                )
+            )
+            .scalar_subquery()
+        )
+        
+        result = await self.db.execute(
+            select(
+                cast(bucket_start, Date).label("period_date"),
+                concept_stats.c.concepts_started,
+                concept_stats.c.concepts_completed,
+                concept_stats.c.concepts_mastered,
+                concept_stats.c.time_spent,
+                concept_stats.c.average_score,
+                points_earned.label("points_earned"),
+                badges_earned.label("badges_earned")
+            )
+            .select_from(buckets.outerjoin(concept_stats, true()))
+            .order_by(bucket_start)
+        )
+        
+        rows = [
+            {"student_id": student_id, "period": period, **row._asdict()}
+            for row in result
+        ]
+        if not rows:
+            return []
+        
+        stmt = pg_insert(Analytics).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["student_id", "period", "period_date"],
+            set_={
+                key: stmt.excluded[key]
+                for key in rows[0]
+                if key not in ("student_id", "period", "period_date")
+            }
+        )
+        await self.db.execute(stmt)
+        await self.db.commit()
+        
+        logger.info("Backfilled analytics", student_id=student_id, period=period, periods=len(rows))
+        
+        return [
+            {**row, "student_id": str(student_id), "period_date": str(row["period_date"])}
+            for row in rows
+        ]
+    
     async def calculate_learning_velocity(
         self,
         student_id: str,
         days: int = 30
     ) -> float:
         """Calculate learning velocity (concepts per day)."""
+        cache_key = await student_cache_key("analytics", student_id, "learning_velocity", days)
+        cached = await get_cached(cache_key)
+        if cached is not None:
+            return cached
+        
         start_date = datetime.utcnow() - timedelta(days=days)
         
         result = await self.db.execute(
@@ -86,15 +222,21 @@ class AnalyticsEngine:
         )
         
         data = result.one()
-        if data.active_days > 0:
-            return data.concepts / data.active_days
-        return 0.0
+        velocity = data.concepts / data.active_days if data.active_days > 0 else 0.0
+        
+        await set_cached(cache_key, velocity, ttl=settings.CACHE_TTL)
+        return velocity
     
     async def calculate_mastery_efficiency(
         self,
         student_id: str
     ) -> Dict[str, float]:
         """Calculate how efficiently student masters concepts."""
+        cache_key = await student_cache_key("analytics", student_id, "mastery_efficiency")
+        cached = await get_cached(cache_key)
+        if cached is not None:
+            return cached
+        
         result = await self.db.execute(
             select(
                 func.avg(ConceptProgress.attempts).label("avg_attempts"),
@@ -112,7 +254,7 @@ class AnalyticsEngine:
         
         data = result.one()
         
-        return {
+        efficiency = {
             "average_attempts_to_mastery": float(data.avg_attempts or 0),
             "average_hours_to_mastery": float(data.avg_hours_to_mastery or 0),
             "efficiency_score": self._calculate_efficiency_score(
@@ -120,6 +262,9 @@ class AnalyticsEngine:
                 data.avg_hours_to_mastery or 0
             )
         }
+        
+        await set_cached(cache_key, efficiency, ttl=settings.CACHE_TTL)
+        return efficiency
     
     async def predict_completion_time(
         self,
@@ -127,15 +272,24 @@ class AnalyticsEngine:
         remaining_concepts: int
     ) -> Dict[str, Any]:
         """Predict time to complete remaining concepts based on historical data."""
+        # Negative cache: students without enough data skip the lookups until
+        # new activity invalidates their analytics cache
+        no_data_key = await student_cache_key("analytics", student_id, "completion_no_data")
+        cached = await get_cached(no_data_key)
+        if cached is not None:
+            return cached
+        
         # Get historical velocity
         velocity = await self.calculate_learning_velocity(student_id)
         
         if velocity <= 0:
-            return {
+            prediction = {
                 "estimated_days": None,
                 "confidence": "low",
                 "recommendation": "Need more learning data to make predictions"
             }
+            await set_cached(no_data_key, prediction, ttl=settings.CACHE_TTL)
+            return prediction
         
         # Calculate estimated days
         estimated_days = remaining_concepts / velocity
@@ -158,14 +312,18 @@ class AnalyticsEngine:
         student_id: str
     ) -> Dict[str, Any]:
         """Generate AI-powered insights based on analytics."""
-        # Get recent metrics
-        metrics = await self._get_recent_metrics(student_id)
-        
-        # Get progress patterns
-        patterns = await self._analyze_progress_patterns(student_id)
-        
-        # Get strengths and weaknesses
-        strengths_weaknesses = await self._analyze_strengths_weaknesses(student_id)
+        cache_key = await student_cache_key("analytics", student_id, "insights")
+        cached = await get_cached(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Metrics, progress patterns and strengths/weaknesses are independent
+        # reads, so run them concurrently on separate sessions
+        metrics, patterns, strengths_weaknesses = await asyncio.gather(
+            self._read_in_new_session(AnalyticsEngine._get_recent_metrics, student_id),
+            self._read_in_new_session(AnalyticsEngine._analyze_progress_patterns, student_id),
+            self._read_in_new_session(AnalyticsEngine._analyze_strengths_weaknesses, student_id)
+        )
         
         insights = []
         recommendations = []
@@ -195,7 +353,7 @@ class AnalyticsEngine:
         if strengths_weaknesses["weaknesses"]:
             recommendations.append(f"Focus more on: {', '.join(strengths_weaknesses['weaknesses'][:3])}")
         
-        return {
+        generated = {
             "insights": insights,
             "recommendations": recommendations,
             "metrics_summary": metrics,
@@ -203,6 +361,22 @@ class AnalyticsEngine:
             "strengths": strengths_weaknesses["strengths"],
             "weaknesses": strengths_weaknesses["weaknesses"]
         }
+        
+        await set_cached(cache_key, generated, ttl=settings.INSIGHTS_CACHE_TTL)
+        return generated
+    
+    async def _read_in_new_session(
+        self,
+        helper: Callable[..., Awaitable[Any]],
+        *args: Any
+    ) -> Any:
+        """Run a read-only helper on its own short-lived session.
+        
+        AsyncSession is not safe for concurrent use, so each helper dispatched
+        through asyncio.gather gets a dedicated session from the factory.
+        """
+        async with self.session_factory() as session:
+            return await helper(AnalyticsEngine(session, self.session_factory), *args)
     
     def _get_date_range(self, period: str, target_date: date) -> tuple:
         """Get start and end date for period."""
@@ -218,127 +392,103 @@ class AnalyticsEngine:
             end = next_month - timedelta(days=next_month.day)
             return start, end
     
-    async def _get_concept_stats(self, student_id: str, start_date: date, end_date: date) -> Dict[str, int]:
-        """Get concept statistics for date range."""
-        result = await self.db.execute(
-            select(
-                func.count(ConceptProgress.id).filter(
-                    ConceptProgress.created_at.between(start_date, end_date + timedelta(days=1))
-                ).label("started"),
-                func.count(ConceptProgress.id).filter(
-                    and_(
-                        ConceptProgress.status == ProgressStatus.COMPLETED.value,
-                        ConceptProgress.completed_at.between(start_date, end_date + timedelta(days=1))
-                    )
-                ).label("completed"),
-                func.count(ConceptProgress.id).filter(
-                    and_(
-                        ConceptProgress.status == ProgressStatus.MASTERED.value,
-                        ConceptProgress.mastered_at.between(start_date, end_date + timedelta(days=1))
-                    )
-                ).label("mastered")
-            ).where(ConceptProgress.student_id == student_id)
-        )
+    async def _get_period_stats(self, student_id: str, start_ts: datetime, end_ts: datetime) -> Dict[str, Any]:
+        """Get all per-period aggregates for a student in a single query."""
+        from app.models.gamification import UserBadge
         
-        stats = result.one()
+        concept_progress = ConceptProgress.__table__
+        point_history = PointHistory.__table__
+        user_badges = UserBadge.__table__
         
-        return {
-            "concepts_started": stats.started,
-            "concepts_completed": stats.completed,
-            "concepts_mastered": stats.mastered
-        }
-    
-    async def _calculate_time_spent(self, student_id: str, start_date: date, end_date: date) -> int:
-        """Calculate time spent in seconds."""
-        # Simplified calculation based on attempts
-        result = await self.db.execute(
-            select(func.sum(ConceptProgress.attempts * 300)).where(  # 5 min per attempt estimate
-                and_(
-                    ConceptProgress.student_id == student_id,
-                    ConceptProgress.last_attempted_at.between(start_date, end_date + timedelta(days=1))
-                )
-            )
-        )
+        def in_window(column):
+            return and_(column >= start_ts, column < end_ts)
         
-        return result.scalar() or 0
-    
-    async def _calculate_average_score(self, student_id: str, start_date: date, end_date: date) -> float:
-        """Calculate average score for period."""
-        result = await self.db.execute(
-            select(func.avg(ConceptProgress.current_score)).where(
+        attempted_in_period = in_window(concept_progress.c.last_attempted_at)
+        
+        points_earned = (
+            select(func.coalesce(func.sum(point_history.c.points_awarded), 0))
+            .where(
                 and_(
-                    ConceptProgress.student_id == student_id,
-                    ConceptProgress.last_attempted_at.between(start_date, end_date + timedelta(days=1)),
-                    ConceptProgress.current_score.isnot(None)
+                    point_history.c.student_id == student_id,
+                    in_window(point_history.c.awarded_at)
                 )
             )
+            .scalar_subquery()
         )
         
-        return float(result.scalar() or 0.0)
-    
-    async def _get_points_earned(self, student_id: str, start_date: date, end_date: date) -> int:
-        """Get points earned in period."""
-        result = await self.db.execute(
-            select(func.sum(PointHistory.points_awarded)).where(
+        badges_earned = (
+            select(func.count(user_badges.c.id))
+            .where(
                 and_(
-                    PointHistory.student_id == student_id,
-                    PointHistory.awarded_at.between(start_date, end_date + timedelta(days=1))
+                    user_badges.c.student_id == student_id,
+                    in_window(user_badges.c.earned_at)
                 )
             )
+            .scalar_subquery()
         )
         
-        return result.scalar() or 0
-    
-    async def _get_badges_earned(self, student_id: str, start_date: date, end_date: date) -> int:
-        """Get badges earned in period."""
-        from app.models.gamification import UserBadge
-        
         result = await self.db.execute(
-            select(func.count(UserBadge.id)).where(
-                and_(
-                    UserBadge.student_id == student_id,
-                    UserBadge.earned_at.between(start_date, end_date + timedelta(days=1))
-                )
-            )
+            select(
+                func.count(concept_progress.c.id).filter(
+                    in_window(concept_progress.c.created_at)
+                ).label("started"),
+                func.count(concept_progress.c.id).filter(
+                    and_(
+                        concept_progress.c.status == ProgressStatus.COMPLETED.value,
+                        in_window(concept_progress.c.completed_at)
+                    )
+                ).label("completed"),
+                func.count(concept_progress.c.id).filter(
+                    and_(
+                        concept_progress.c.status == ProgressStatus.MASTERED.value,
+                        in_window(concept_progress.c.mastered_at)
+                    )
+                ).label("mastered"),
+                func.sum(concept_progress.c.time_spent).filter(attempted_in_period).label("time_spent"),
+                func.avg(concept_progress.c.current_score).filter(
+                    and_(
+                        attempted_in_period,
+                        concept_progress.c.current_score.isnot(None)
+                    )
+                ).label("avg_score"),
+                points_earned.label("points_earned"),
+                badges_earned.label("badges_earned")
+            ).where(concept_progress.c.student_id == student_id)
         )
         
-        return result.scalar() or 0
+        stats = result.one()
+        
+        return {
+            "concepts_started": stats.started,
+            "concepts_completed": stats.completed,
+            "concepts_mastered": stats.mastered,
+            "time_spent": stats.time_spent or 0,
+            "average_score": float(stats.avg_score or 0.0),
+            "points_earned": stats.points_earned or 0,
+            "badges_earned": stats.badges_earned or 0
+        }
     
     async def _save_analytics(self, student_id: str, period: str, period_date: date, stats: Dict[str, Any]) -> Dict[str, Any]:
-        """Save analytics to database."""
-        # Check for existing record
-        result = await self.db.execute(
-            select(Analytics).where(
-                and_(
-                    Analytics.student_id == student_id,
-                    Analytics.period == period,
-                    Analytics.period_date == period_date
-                )
-            )
+        """Upsert analytics for the student and period in a single statement."""
+        stmt = pg_insert(Analytics).values(
+            student_id=student_id,
+            period=period,
+            period_date=period_date,
+            **stats
         )
-        analytics = result.scalar_one_or_none()
-        
-        if analytics:
-            # Update existing
-            for key, value in stats.items():
-                setattr(analytics, key, value)
-        else:
-            # Create new
-            analytics = Analytics(
-                student_id=student_id,
-                period=period,
-                period_date=period_date,
-                **stats
-            )
-            self.db.add(analytics)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["student_id", "period", "period_date"],
+            set_={key: stmt.excluded[key] for key in stats}
+        ).returning(Analytics.student_id, Analytics.period, Analytics.period_date)
         
+        result = await self.db.execute(stmt)
+        saved = result.one()
         await self.db.commit()
-        await self.db.refresh(analytics)
         
         return {
-            "student_id": str(analytics.student_id),
-            "period": analytics.period,
-            "period_date": str(analytics.period_date),
+            "student_id": str(saved.student_id),
+            "period": saved.period,
+            "period_date": str(saved.period_date),
             **stats
         }
     
@@ -352,14 +502,17 @@ class AnalyticsEngine:
     
     async def _calculate_learning_consistency(self, student_id: str) -> float:
         """Calculate learning consistency (0-1)."""
+        concept_progress = ConceptProgress.__table__
         result = await self.db.execute(
             select(
-                func.count(func.distinct(func.date(ConceptProgress.last_attempted_at))).label("active_days"),
-                func.datediff(
-                    func.max(ConceptProgress.last_attempted_at),
-                    func.min(ConceptProgress.created_at)
+                func.count(func.distinct(func.date(concept_progress.c.last_attempted_at))).label("active_days"),
+                (
+                    func.extract(
+                        'epoch',
+                        func.max(concept_progress.c.last_attempted_at) - func.min(concept_progress.c.created_at)
+                    ) / 86400
                 ).label("total_days")
-            ).where(ConceptProgress.student_id == student_id)
+            ).where(concept_progress.c.student_id == student_id)
         )
         
         data = result.one()
@@ -378,29 +531,28 @@ class AnalyticsEngine:
             return f"Increase your pace to {target_velocity:.1f} concepts/day to complete within 2 months."
     
     async def _get_recent_metrics(self, student_id: str) -> Dict[str, float]:
-        """Get recent learning metrics."""
+        """Get the latest value of each learning metric."""
+        learning_metrics = LearningMetrics.__table__
         result = await self.db.execute(
             select(
-                LearningMetrics.metric_type,
-                LearningMetrics.metric_value
+                learning_metrics.c.metric_type,
+                learning_metrics.c.metric_value
+            ).distinct(
+                learning_metrics.c.metric_type
             ).where(
-                LearningMetrics.student_id == student_id
+                learning_metrics.c.student_id == student_id
             ).order_by(
-                LearningMetrics.calculated_at.desc()
-            ).limit(10)
+                learning_metrics.c.metric_type,
+                learning_metrics.c.calculated_at.desc()
+            )
         )
         
-        metrics = {}
-        for row in result:
-            if row.metric_type not in metrics:
-                metrics[row.metric_type] = row.metric_value
-        
-        return metrics
+        return dict(result.all())
     
     async def _analyze_progress_patterns(self, student_id: str) -> Dict[str, Any]:
         """Analyze progress patterns over time."""
-        # Get weekly analytics for trend analysis
-        result = await self.db.execute(
+        # Stream weekly analytics for trend analysis
+        result = await self.db.stream(
             select(
                 Analytics.period_date,
                 Analytics.concepts_mastered,
@@ -410,50 +562,75 @@ class AnalyticsEngine:
                     Analytics.student_id == student_id,
                     Analytics.period == "weekly"
                 )
-            ).order_by(Analytics.period_date).limit(8)
+            ).order_by(Analytics.period_date).limit(8).execution_options(yield_per=64)
         )
         
-        data = result.all()
-        if len(data) < 2:
+        # Single-pass least-squares regression of velocity over week index
+        n = 0
+        sum_x = sum_y = sum_xy = sum_xx = 0.0
+        peak_week = None
+        peak_mastered = -1
+        
+        async for row in result:
+            velocity = row.concepts_mastered / max(row.time_spent / 3600, 1)
+            sum_x += n
+            sum_y += velocity
+            sum_xy += n * velocity
+            sum_xx += n * n
+            if row.concepts_mastered > peak_mastered:
+                peak_mastered = row.concepts_mastered
+                peak_week = row.period_date
+            n += 1
+        
+        if n < 2:
             return {}
         
-        # Calculate velocity trend
-        velocities = [d.concepts_mastered / max(d.time_spent / 3600, 1) for d in data]
-        velocity_trend = np.polyfit(range(len(velocities)), velocities, 1)[0]
+        denominator = n * sum_xx - sum_x * sum_x
+        velocity_trend = (n * sum_xy - sum_x * sum_y) / denominator if denominator else 0.0
         
         return {
             "velocity_trend": velocity_trend,
-            "recent_weeks": len(data),
-            "peak_week": max(data, key=lambda x: x.concepts_mastered).period_date.isoformat()
+            "recent_weeks": n,
+            "peak_week": peak_week.isoformat()
         }
     
     async def _analyze_strengths_weaknesses(self, student_id: str) -> Dict[str, List[str]]:
         """Analyze student's strengths and weaknesses."""
-        # This is simplified - in production would analyze by subject/topic
-        result = await self.db.execute(
+        # Rank subjects in SQL and only return the top three strengths and
+        # any weak subjects
+        subject = ConceptProgress.subject
+        avg_score = func.avg(ConceptProgress.current_score)
+        
+        ranked = (
             select(
-                ConceptProgress.metadata["subject"].astext.label("subject"),
-                func.avg(ConceptProgress.current_score).label("avg_score"),
-                func.count(ConceptProgress.id).label("attempts")
+                subject.label("subject"),
+                avg_score.label("avg_score"),
+                func.row_number().over(order_by=avg_score.desc()).label("rank")
             ).where(
                 and_(
                     ConceptProgress.student_id == student_id,
                     ConceptProgress.current_score.isnot(None)
                 )
             ).group_by(
-                ConceptProgress.metadata["subject"].astext
+                subject
             ).having(
                 func.count(ConceptProgress.id) >= 3
             )
+        ).cte("ranked_subjects")
+        
+        result = await self.db.execute(
+            select(ranked.c.subject, ranked.c.avg_score).where(
+                or_(
+                    and_(ranked.c.rank <= 3, ranked.c.avg_score >= 80),
+                    ranked.c.avg_score < 70
+                )
+            ).order_by(ranked.c.rank)
         )
         
         subjects = result.all()
         
-        # Sort by average score
-        sorted_subjects = sorted(subjects, key=lambda x: x.avg_score, reverse=True)
-        
-        strengths = [s.subject for s in sorted_subjects[:3] if s.avg_score >= 80]
-        weaknesses = [s.subject for s in sorted_subjects if s.avg_score < 70]
+        strengths = [s.subject for s in subjects if s.avg_score >= 80]
+        weaknesses = [s.subject for s in subjects if s.avg_score < 70]
         
         return {
             "strengths": strengths,
@@ -0,0 +1,91 @@
+"""Redis-backed memoization helpers."""
+
+import hashlib
+import json
+from typing import Any, Optional
+
+from prometheus_client import Counter
+import structlog
+
+from app.core.dependencies import get_redis_cache
+
+logger = structlog.get_logger()
+
+CACHE_LOOKUPS = Counter(
+    "progress_cache_lookups_total",
+    "Cache lookups by namespace and result",
+    ["namespace", "result"]
+)
+
+
+def make_cache_key(namespace: str, *parts: Any) -> str:
+    """Build a compact cache key from a namespace and key parts."""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+    return f"{namespace}:{digest}"
+
+
+def make_etag(value: Any) -> str:
+    """Build a strong ETag from a JSON-serializable value."""
+    body = json.dumps(value, default=str, sort_keys=True)
+    return f'"{hashlib.sha1(body.encode()).hexdigest()}"'
+
+
+async def student_cache_key(namespace: str, student_id: str, *parts: Any) -> str:
+    """Build a cache key scoped to the student's current cache generation."""
+    generation = await get_generation(f"{namespace}:gen:{student_id}")
+    return make_cache_key(namespace, student_id, generation, *parts)
+
+
+async def get_cached(key: str) -> Optional[Any]:
+    """Get a cached value, treating cache errors as a miss."""
+    try:
+        cache = await get_redis_cache()
+        raw = await cache.get(key)
+    except Exception as e:
+        logger.warning("Cache read failed", key=key, error=str(e))
+        return None
+    
+    namespace = key.partition(":")[0]
+    if raw is None:
+        CACHE_LOOKUPS.labels(namespace, "miss").inc()
+        return None
+    CACHE_LOOKUPS.labels(namespace, "hit").inc()
+    return json.loads(raw) if isinstance(raw, (str, bytes)) else raw
+
+
+async def set_cached(key: str, value: Any, ttl: int) -> None:
+    """Cache a JSON-serializable value for ttl seconds."""
+    try:
+        cache = await get_redis_cache()
+        await cache.set(key, json.dumps(value, default=str), ttl=ttl)
+    except Exception as e:
+        logger.warning("Cache write failed", key=key, error=str(e))
+
+
+async def get_generation(generation_key: str) -> int:
+    """Get the current value of a cache generation counter."""
+    # Read the client directly so counter lookups stay out of CACHE_LOOKUPS
+    try:
+        cache = await get_redis_cache()
+        raw = await cache.get(generation_key)
+    except Exception as e:
+        logger.warning("Cache read failed", key=generation_key, error=str(e))
+        return 0
+    
+    if raw is None:
+        return 0
+    return int(raw)
+
+
+async def bump_generation(generation_key: str) -> None:
+    """Invalidate every entry keyed on a generation counter by incrementing it."""
+    try:
+        cache = await get_redis_cache()
+        await cache.increment(generation_key)
+    except Exception as e:
+        logger.warning("Cache invalidation failed", key=generation_key, error=str(e))
+
+
+async def invalidate_student(namespace: str, student_id: str) -> None:
+    """Invalidate every cached entry for a student by bumping its generation."""
+    await bump_generation(f"{namespace}:gen:{student_id}")
\ No newline at end of file
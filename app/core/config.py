@@ -1,7 +1,6 @@
 """Configuration management for Progress Service."""
 
-from typing import List, Optional
-from functools import lru_cache
+from typing import Optional, Tuple
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field, field_validator, PostgresDsn
@@ -28,6 +27,10 @@ class Settings(BaseSettings):
     DATABASE_URL: PostgresDsn
     DATABASE_POOL_SIZE: int = 20
     DATABASE_MAX_OVERFLOW: int = 40
+    DATABASE_POOL_RECYCLE: int = 1800  # seconds
+    DATABASE_MAX_CONCURRENT_QUERIES: int = 4  # per request, see execute_concurrently
+    DATABASE_QUERY_CACHE_SIZE: int = 1200
+    DATABASE_STATEMENT_CACHE_SIZE: int = 500
     
     # Redis Cache
     REDIS_URL: str = "redis://localhost:6379"
@@ -48,6 +51,8 @@ class Settings(BaseSettings):
     POINTS_CONCEPT_COMPLETED: int = 10
     POINTS_CONCEPT_MASTERED: int = 25
     POINTS_PERFECT_SCORE_BONUS: int = 10
+    POINTS_SPEED_BONUS: int = 5
+    SPEED_BONUS_THRESHOLD_SECONDS: int = 300  # 5 minutes
     POINTS_DAILY_STREAK: int = 5
     POINTS_WEEKLY_GOAL: int = 50
     STREAK_GRACE_HOURS: int = 36
@@ -56,12 +61,15 @@ class Settings(BaseSettings):
     ANALYTICS_RETENTION_DAYS: int = 365
     REPORT_GENERATION_TIMEOUT: int = 60
     ENABLE_AI_INSIGHTS: bool = True
+    INSIGHTS_CACHE_TTL: int = 300  # 5 minutes
     
     # Notifications
     EMAIL_ENABLED: bool = True
     SMS_ENABLED: bool = False
     PUSH_NOTIFICATIONS_ENABLED: bool = True
     NOTIFICATION_BATCH_SIZE: int = 100
+    NOTIFICATION_WORKERS: int = 8
+    NOTIFICATION_QUEUE_SIZE: int = 10_000
     
     # AWS (for SES)
     AWS_REGION: str = "us-east-1"
@@ -80,23 +88,25 @@ class Settings(BaseSettings):
     # Dashboard
     LEADERBOARD_SIZE: int = 100
     LEADERBOARD_CACHE_TTL: int = 300  # 5 minutes
+    LEADERBOARD_REFRESH_INTERVAL: int = 900  # 15 minutes, rolling points decay
     DASHBOARD_CACHE_TTL: int = 60  # 1 minute
+    AGGREGATE_CACHE_TTL: int = 300  # 5 minutes, for class and platform rollups
     
     # Logging
     LOG_LEVEL: str = Field(default="INFO", pattern="^(DEBUG|INFO|WARNING|ERROR|CRITICAL)$")
     LOG_FORMAT: str = Field(default="json", pattern="^(json|plain)$")
     
     # CORS
-    CORS_ORIGINS: List[str] = Field(default_factory=list)
+    CORS_ORIGINS: Tuple[str, ...] = ()
     
     @field_validator("CORS_ORIGINS", mode="before")
     def parse_cors_origins(cls, v):
         if isinstance(v, str):
             try:
-                return json.loads(v)
+                return tuple(json.loads(v))
             except json.JSONDecodeError:
-                return [origin.strip() for origin in v.split(",")]
-        return v
+                return tuple(origin.strip() for origin in v.split(","))
+        return tuple(v)
     
     # Rate Limiting
     RATE_LIMIT_ENABLED: bool = True
@@ -111,11 +121,10 @@ class Settings(BaseSettings):
         return self.ENVIRONMENT == "production"
 
 
-@lru_cache()
-def get_settings() -> Settings:
-    """Get cached settings instance."""
-    return Settings()
+# Global settings instance, built once at import
+settings = Settings()
 
 
-# Global settings instance
-settings = get_settings()
\ No newline at end of file
+def get_settings() -> Settings:
+    """Get the shared settings instance."""
+    return settings
\ No newline at end of file
@@ -1,6 +1,9 @@
 """Database configuration and session management."""
 
-from typing import AsyncGenerator
+import asyncio
+from typing import AsyncGenerator, List
+from sqlalchemy import func
+from sqlalchemy.engine import Result
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.pool import NullPool
@@ -17,7 +20,14 @@ engine = create_async_engine(
     pool_size=settings.DATABASE_POOL_SIZE,
     max_overflow=settings.DATABASE_MAX_OVERFLOW,
     pool_pre_ping=True,
-    pool_recycle=3600,
+    pool_recycle=settings.DATABASE_POOL_RECYCLE,
+    query_cache_size=settings.DATABASE_QUERY_CACHE_SIZE,
+    connect_args={
+        # asyncpg's own statement cache and the SQLAlchemy adapter's prepared
+        # statement cache, so each distinct SQL string is prepared once per connection
+        "statement_cache_size": settings.DATABASE_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": settings.DATABASE_STATEMENT_CACHE_SIZE,
+    },
     poolclass=NullPool if settings.ENVIRONMENT == "test" else None,
 )
 
@@ -34,12 +44,43 @@ AsyncSessionLocal = async_sessionmaker(
 Base = declarative_base()
 
 
+def utc_now():
+    """Server-side UTC timestamp for naive DateTime column defaults."""
+    return func.timezone("utc", func.now())
+
+
+async def execute_in_new_session(statement) -> Result:
+    """Execute a statement on its own short-lived session.
+    
+    AsyncSession is not safe for concurrent use, so statements run together
+    with asyncio.gather each need their own session. The result is buffered
+    and can be read after the session closes.
+    """
+    async with AsyncSessionLocal() as session:
+        return await session.execute(statement)
+
+
+async def execute_concurrently(*statements) -> List[Result]:
+    """Execute independent statements concurrently, each on its own session.
+    
+    At most DATABASE_MAX_CONCURRENT_QUERIES run at once, so a single request
+    cannot take over the connection pool. Results come back in order.
+    """
+    slots = asyncio.Semaphore(settings.DATABASE_MAX_CONCURRENT_QUERIES)
+    
+    async def run(statement) -> Result:
+        async with slots:
+            return await execute_in_new_session(statement)
+    
+    return await asyncio.gather(*(run(statement) for statement in statements))
+
+
 async def init_db():
     """Initialize database, create tables if needed."""
     try:
         async with engine.begin() as conn:
             # Import all models to ensure they're registered
-            from app.models import progress, gamification, analytics
+            from app.models import progress, gamification, analytics, notification
             
             # Create all tables
             await conn.run_sync(Base.metadata.create_all)
@@ -1,6 +1,8 @@
 """Shared dependencies for Progress Service."""
 
 from typing import Optional
+from functools import lru_cache
+import time
 import httpx
 from aiocache import Cache
 import structlog
@@ -43,8 +45,19 @@ async def get_http_client() -> httpx.AsyncClient:
     global _http_client
     
     if _http_client is None:
+        # Transport owns pooling and HTTP/2; client-level http2/limits are
+        # ignored once a transport is passed explicitly
         _http_client = httpx.AsyncClient(
-            timeout=httpx.Timeout(30.0),
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=200,
+                    max_keepalive_connections=50,
+                    keepalive_expiry=30.0
+                ),
+                retries=1
+            ),
+            timeout=httpx.Timeout(30.0, connect=5.0),
             headers={
                 "Content-Type": "application/json",
                 "User-Agent": f"{settings.SERVICE_NAME}/{settings.APP_VERSION}"
@@ -54,6 +67,15 @@ async def get_http_client() -> httpx.AsyncClient:
     return _http_client
 
 
+async def close_http_client():
+    """Close the shared HTTP client."""
+    global _http_client
+    
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token."""
     to_encode = data.copy()
@@ -67,16 +89,30 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
+@lru_cache(maxsize=4096)
+def _decode_token(token: str) -> dict:
+    """Verify and decode a JWT, memoized per token.
+    
+    Invalid tokens raise and are never cached; expiry of cached payloads is
+    re-checked by the caller.
+    """
+    return jwt.decode(
+        token,
+        settings.JWT_SECRET,
+        algorithms=[settings.JWT_ALGORITHM]
+    )
+
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Get current user from JWT token."""
     token = credentials.credentials
     
     try:
-        payload = jwt.decode(
-            token,
-            settings.JWT_SECRET,
-            algorithms=[settings.JWT_ALGORITHM]
-        )
+        payload = _decode_token(token)
+        exp = payload.get("exp")
+        if exp is not None and exp <= time.time():
+            raise JWTError("Token has expired")
+        
         user_id: str = payload.get("sub")
         if user_id is None:
             raise HTTPException(
@@ -90,4 +126,16 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
-        )
\ No newline at end of file
+        )
+
+
+def require_roles(current_user: dict, *roles: str) -> None:
+    """Raise 403 unless the user holds at least one of the given roles."""
+    if frozenset(roles).isdisjoint(current_user.get("roles", ())):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+
+
+def require_self_or_role(current_user: dict, student_id: str, *roles: str) -> None:
+    """Raise 403 unless the user is the student or holds one of the given roles."""
+    if current_user["sub"] != student_id:
+        require_roles(current_user, *roles)
\ No newline at end of file
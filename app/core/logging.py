@@ -1,6 +1,7 @@
 """Structured logging configuration."""
 
 import sys
+import orjson
 import structlog
 from structlog.processors import JSONRenderer, TimeStamper, add_log_level
 from structlog.stdlib import add_logger_name
@@ -8,12 +9,21 @@ from structlog.stdlib import add_logger_name
 from app.core.config import settings
 
 
+def _orjson_dumps(obj, **kwargs) -> str:
+    """Serialize log events with orjson for structlog's JSONRenderer."""
+    return orjson.dumps(
+        obj,
+        default=kwargs.get("default"),
+        option=orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z
+    ).decode()
+
+
 def setup_logging():
     """Configure structured logging."""
     
     # Determine renderer based on environment
     if settings.LOG_FORMAT == "json":
-        renderer = JSONRenderer()
+        renderer = JSONRenderer(serializer=_orjson_dumps)
     else:
         renderer = structlog.dev.ConsoleRenderer()
     
@@ -27,7 +37,6 @@ def setup_logging():
             structlog.processors.StackInfoRenderer(),
             structlog.processors.format_exc_info,
             TimeStamper(fmt="iso"),
-            structlog.processors.dict_tracebacks,
             renderer,
         ],
         context_class=dict,
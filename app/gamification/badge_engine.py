@@ -1,17 +1,65 @@
 """Badge awarding and tracking engine."""
 
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, NamedTuple, Optional, Callable, Awaitable, Tuple
 from datetime import datetime, timedelta
+import time
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
+from sqlalchemy import select, and_, exists, func, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 import json
 import structlog
 
+from app.core.cache import get_cached, set_cached, get_generation, bump_generation
 from app.models.gamification import Badge, UserBadge, BadgeCategory
 from app.models.progress import ConceptProgress, ProgressStatus
 
 logger = structlog.get_logger()
 
+BADGE_CACHE_GENERATION_KEY = "badges:gen"
+BADGE_CACHE_TTL = 300  # 5 minutes
+QUICK_LEARNER_MASTERED = 5
+
+
+class BadgeView(NamedTuple):
+    """Immutable view of an active badge definition."""
+    id: str
+    name: str
+    description: str
+    criteria: Dict[str, Any]
+    points_value: int
+    icon_url: Optional[str]
+
+
+# In-process copy of the badge catalog: generation -> (loaded_at, badges)
+_catalog: Dict[int, Tuple[float, Tuple[BadgeView, ...]]] = {}
+
+EARNED_BADGE_CACHE_SIZE = 10_000
+
+# (generation, student_id, badge_id) -> (loaded_at, badge) for badges a student has earned
+_earned_badges: Dict[Tuple[int, str, str], Tuple[float, BadgeView]] = {}
+
+
+# Consistency King: 7-day learning streak
+async def _consistency_king(db: AsyncSession, student_id: str, event_data: Dict[str, Any]) -> bool:
+    return event_data.get("streak_days", 0) >= 7
+
+
+# Subject Master: Master all concepts in a subject
+async def _subject_master(db: AsyncSession, student_id: str, event_data: Dict[str, Any]) -> bool:
+    if not event_data.get("subject"):
+        return False
+    # This would need to check against content service
+    # For now, simplified check
+    return event_data.get("subject_completion", 0) >= 100
+
+
+# Badge criteria keyed by (badge name, triggering event type). Quick Learner
+# is awarded server-side by BadgeEngine.sql_award_criteria_badges.
+_CRITERIA: Dict[Tuple[str, str], Callable[[AsyncSession, str, Dict[str, Any]], Awaitable[bool]]] = {
+    ("Consistency King", "daily_streak"): _consistency_king,
+    ("Subject Master", "concept_mastered"): _subject_master,
+}
+
 
 class BadgeEngine:
     """Engine for checking and awarding badges."""
@@ -25,105 +73,245 @@ class BadgeEngine:
         event_type: str,
         event_data: Dict[str, Any]
     ) -> List[Dict[str, Any]]:
-        """Check if student earned any badges based on event."""
-        earned_badges = []
-        
-        # Get all active badges
-        result = await self.db.execute(
-            select(Badge).where(Badge.is_active == True)
-        )
-        badges = result.scalars().all()
+        """Check if student earned any badges based on event.
         
-        for badge in badges:
-            if await self._check_badge_criteria(student_id, badge, event_type, event_data):
-                # Award badge if not already earned
-                user_badge = await self._award_badge(student_id, badge)
-                if user_badge:
-                    earned_badges.append({
-                        "badge_id": str(badge.id),
-                        "name": badge.name,
-                        "description": badge.description,
-                        "icon_url": badge.icon_url,
-                        "points_value": badge.points_value
-                    })
-        
-        return earned_badges
-    
-    async def _check_badge_criteria(
-        self,
-        student_id: str,
-        badge: Badge,
-        event_type: str,
-        event_data: Dict[str, Any]
-    ) -> bool:
-        """Check if badge criteria are met."""
-        criteria = badge.criteria
+        Awards are written in the caller's transaction; the caller commits.
+        """
+        # Get active badges with a criteria handler for this event type
+        badges = [
+            (badge, _CRITERIA[(badge.name, event_type)])
+            for badge in await self._get_active_badges_cached()
+            if (badge.name, event_type) in _CRITERIA
+        ]
         
-        # Quick Learner: Master 5 concepts in one day
-        if badge.name == "Quick Learner":
-            if event_type == "concept_mastered":
-                result = await self.db.execute(
-                    select(ConceptProgress).where(
-                        and_(
-                            ConceptProgress.student_id == student_id,
-                            ConceptProgress.status == ProgressStatus.MASTERED.value,
-                            ConceptProgress.mastered_at >= datetime.utcnow() - timedelta(days=1)
-                        )
+        candidates = []
+        if badges:
+            # Skip badges the student already holds with a single IN lookup
+            result = await self.db.execute(
+                select(UserBadge.badge_id).where(
+                    and_(
+                        UserBadge.student_id == student_id,
+                        UserBadge.badge_id.in_([badge.id for badge, _ in badges])
                     )
                 )
-                mastered_today = len(result.scalars().all())
-                return mastered_today >= 5
+            )
+            already_earned = {str(badge_id) for badge_id in result.scalars().all()}
+            
+            # Criteria run in turn on the caller's session
+            candidates = [
+                badge for badge, handler in badges
+                if badge.id not in already_earned and await handler(self.db, student_id, event_data)
+            ]
         
-        # Consistency King: 7-day learning streak
-        elif badge.name == "Consistency King":
-            if event_type == "daily_streak":
-                return event_data.get("streak_days", 0) >= 7
+        awarded_ids = await self._award_badges(student_id, candidates)
         
-        # Subject Master: Master all concepts in a subject
-        elif badge.name == "Subject Master":
-            if event_type == "concept_mastered":
-                subject = event_data.get("subject")
-                if subject:
-                    # This would need to check against content service
-                    # For now, simplified check
-                    return event_data.get("subject_completion", 0) >= 100
+        earned_badges = [
+            {
+                "badge_id": badge.id,
+                "name": badge.name,
+                "description": badge.description,
+                "icon_url": badge.icon_url,
+                "points_value": badge.points_value
+            }
+            for badge in candidates
+            if badge.id in awarded_ids
+        ]
         
-        # Add more badge criteria checks...
+        if event_type == "concept_mastered":
+            earned_badges.extend(await self.sql_award_criteria_badges(student_id))
         
-        return False
+        return earned_badges
     
-    async def _award_badge(self, student_id: str, badge: Badge) -> Optional[UserBadge]:
-        """Award badge to student if not already earned."""
-        # Check if already earned
-        result = await self.db.execute(
-            select(UserBadge).where(
+    async def sql_award_criteria_badges(self, student_id: str) -> List[Dict[str, Any]]:
+        """Check and award SQL-expressible badge criteria in a single INSERT ... SELECT."""
+        now = datetime.utcnow()
+        
+        # Quick Learner: Master 5 concepts in one day. The LIMIT lets Postgres
+        # stop scanning as soon as the threshold is reached.
+        mastered_today_rows = (
+            select(literal(1))
+            .where(
                 and_(
-                    UserBadge.student_id == student_id,
-                    UserBadge.badge_id == badge.id
+                    ConceptProgress.student_id == student_id,
+                    ConceptProgress.status == ProgressStatus.MASTERED.value,
+                    ConceptProgress.mastered_at >= now - timedelta(days=1)
                 )
             )
+            .limit(QUICK_LEARNER_MASTERED)
+            .subquery()
         )
-        existing = result.scalar_one_or_none()
+        mastered_today = select(func.count()).select_from(mastered_today_rows).scalar_subquery()
         
-        if existing:
-            return None
+        already_earned = exists().where(
+            and_(
+                UserBadge.student_id == student_id,
+                UserBadge.badge_id == Badge.id
+            )
+        )
         
-        # Award new badge
-        user_badge = UserBadge(
-            student_id=student_id,
-            badge_id=badge.id
+        eligible = select(
+            func.gen_random_uuid(),
+            literal(student_id, UserBadge.student_id.type),
+            Badge.id
+        ).where(
+            and_(
+                Badge.is_active == True,
+                Badge.name == "Quick Learner",
+                mastered_today >= QUICK_LEARNER_MASTERED,
+                ~already_earned
+            )
+        )
+        
+        awarded = (
+            pg_insert(UserBadge)
+            .from_select(["id", "student_id", "badge_id"], eligible)
+            .on_conflict_do_nothing(index_elements=["student_id", "badge_id"])
+            .returning(UserBadge.badge_id)
+            .cte("awarded")
         )
-        self.db.add(user_badge)
         
         try:
-            await self.db.commit()
+            # Savepoint so a failed award does not abort the caller's transaction
+            async with self.db.begin_nested():
+                result = await self.db.execute(
+                    select(
+                        Badge.id,
+                        Badge.name,
+                        Badge.description,
+                        Badge.icon_url,
+                        Badge.points_value
+                    ).join(awarded, awarded.c.badge_id == Badge.id)
+                )
+                rows = result.all()
+        except Exception as e:
+            logger.error("Failed to award badges", error=str(e))
+            return []
+        
+        for row in rows:
             logger.info(
                 "Badge awarded",
                 student_id=student_id,
-                badge_name=badge.name
+                badge_name=row.name
+            )
+        
+        return [
+            {
+                "badge_id": str(row.id),
+                "name": row.name,
+                "description": row.description,
+                "icon_url": row.icon_url,
+                "points_value": row.points_value
+            }
+            for row in rows
+        ]
+    
+    async def _get_active_badges_cached(self) -> Tuple[BadgeView, ...]:
+        """Get the active badge catalog, served from cache between badge changes."""
+        generation = await get_generation(BADGE_CACHE_GENERATION_KEY)
+        
+        # Serve the in-process copy while it matches the current generation
+        cached = _catalog.get(generation)
+        if cached is not None and time.monotonic() - cached[0] < BADGE_CACHE_TTL:
+            return cached[1]
+        
+        cache_key = f"badges:active:v{generation}"
+        rows = await get_cached(cache_key)
+        if rows is None:
+            # Stream the catalog in batches rather than buffering the whole result
+            result = await self.db.stream(
+                select(
+                    Badge.id,
+                    Badge.name,
+                    Badge.description,
+                    Badge.criteria,
+                    Badge.points_value,
+                    Badge.icon_url
+                ).where(Badge.is_active == True).execution_options(yield_per=256)
             )
-            return user_badge
+            rows = [{**row._asdict(), "id": str(row.id)} async for row in result]
+            await set_cached(cache_key, rows, ttl=BADGE_CACHE_TTL)
+        
+        badges = tuple(BadgeView(**row) for row in rows)
+        _catalog.clear()
+        _catalog[generation] = (time.monotonic(), badges)
+        return badges
+    
+    async def get_earned_badge(self, student_id: str, badge_id: str) -> Optional[BadgeView]:
+        """Get a badge the student has earned, or None if they have not earned it.
+        
+        Earned badges are never revoked, so hits are cached in-process and in
+        Redis until the badge generation changes; misses always query.
+        """
+        generation = await get_generation(BADGE_CACHE_GENERATION_KEY)
+        local_key = (generation, str(student_id), str(badge_id))
+        
+        cached = _earned_badges.get(local_key)
+        if cached is not None and time.monotonic() - cached[0] < BADGE_CACHE_TTL:
+            return cached[1]
+        
+        cache_key = f"badges:earned:v{generation}:{student_id}:{badge_id}"
+        row = await get_cached(cache_key)
+        if row is None:
+            result = await self.db.execute(
+                select(
+                    Badge.id,
+                    Badge.name,
+                    Badge.description,
+                    Badge.criteria,
+                    Badge.points_value,
+                    Badge.icon_url
+                )
+                .join(UserBadge, UserBadge.badge_id == Badge.id)
+                .where(
+                    UserBadge.student_id == student_id,
+                    UserBadge.badge_id == badge_id
+                )
+            )
+            found = result.one_or_none()
+            if found is None:
+                return None
+            row = {**found._asdict(), "id": str(found.id)}
+            await set_cached(cache_key, row, ttl=BADGE_CACHE_TTL)
+        
+        badge = BadgeView(**row)
+        if len(_earned_badges) >= EARNED_BADGE_CACHE_SIZE:
+            # Evict the oldest entry
+            _earned_badges.pop(next(iter(_earned_badges)))
+        _earned_badges[local_key] = (time.monotonic(), badge)
+        return badge
+    
+    @staticmethod
+    async def invalidate_badges_cache() -> None:
+        """Invalidate the cached badge catalog after badges are created or changed."""
+        await bump_generation(BADGE_CACHE_GENERATION_KEY)
+    
+    async def _award_badges(self, student_id: str, badges: List[BadgeView]) -> set:
+        """Award badges in one statement, returning the ids that were newly inserted."""
+        if not badges:
+            return set()
+        
+        stmt = pg_insert(UserBadge).values([
+            {"student_id": student_id, "badge_id": badge.id}
+            for badge in badges
+        ]).on_conflict_do_nothing(
+            index_elements=["student_id", "badge_id"]
+        ).returning(UserBadge.badge_id)
+        
+        try:
+            # Savepoint so a failed award does not abort the caller's transaction
+            async with self.db.begin_nested():
+                result = await self.db.execute(stmt)
+                awarded_ids = {str(badge_id) for badge_id in result.scalars().all()}
         except Exception as e:
-            logger.error("Failed to award badge", error=str(e))
-            await self.db.rollback()
-            return None
\ No newline at end of file
+            logger.error("Failed to award badges", error=str(e))
+            return set()
+        
+        for badge in badges:
+            if badge.id in awarded_ids:
+                logger.info(
+                    "Badge awarded",
+                    student_id=student_id,
+                    badge_name=badge.name
+                )
+        
+        return awarded_ids
\ No newline at end of file
@@ -1,16 +1,48 @@
 """Points calculation and awarding engine."""
 
-from typing import Dict, Any, Optional
-from datetime import datetime
+from typing import Dict, Any, List, NamedTuple, Optional
+from collections import defaultdict
+from datetime import datetime, timedelta
+from math import isqrt
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update, insert, bindparam, func, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+import asyncio
 import structlog
 
 from app.models.gamification import Points, PointHistory
 from app.core.config import settings
+from app.core.database import AsyncSessionLocal, utc_now
 
 logger = structlog.get_logger()
 
+# Event point values, resolved from settings once at import
+_POINTS_MAP = {
+    "concept_started": settings.POINTS_CONCEPT_STARTED,
+    "concept_completed": settings.POINTS_CONCEPT_COMPLETED,
+    "concept_mastered": settings.POINTS_CONCEPT_MASTERED,
+    "daily_streak": settings.POINTS_DAILY_STREAK,
+    "weekly_goal": settings.POINTS_WEEKLY_GOAL,
+}
+_PERFECT_SCORE_BONUS = settings.POINTS_PERFECT_SCORE_BONUS
+_SPEED_BONUS = settings.POINTS_SPEED_BONUS
+_SPEED_BONUS_THRESHOLD = settings.SPEED_BONUS_THRESHOLD_SECONDS
+
+# Leaderboard rolling windows: Points column -> window length in days
+ROLLING_WINDOWS = {
+    "points_last_1d": 1,
+    "points_last_7d": 7,
+    "points_last_30d": 30,
+}
+
+
+class AwardItem(NamedTuple):
+    """A single points award for award_points_bulk."""
+    student_id: str
+    points: int
+    reason: str
+    concept_id: Optional[str] = None
+
 
 class PointsEngine:
     """Engine for calculating and awarding points."""
@@ -25,34 +57,68 @@ class PointsEngine:
         reason: str,
         concept_id: Optional[str] = None
     ) -> Dict[str, Any]:
-        """Award points to a student."""
+        """Award points to a student.
+        
+        Runs in the caller's transaction; the caller commits.
+        """
         try:
-            # Get or create points record
-            student_points = await self._get_or_create_points(student_id)
+            # Add the points in a single upsert. points_to_next_level is kept
+            # correct for the current level; a level up is patched below.
+            stmt = pg_insert(Points).values(
+                student_id=student_id,
+                total_points=points,
+                lifetime_points=points,
+                points_last_1d=points,
+                points_last_7d=points,
+                points_last_30d=points,
+                current_level=1,
+                points_to_next_level=100 - points
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["student_id"],
+                set_={
+                    "total_points": Points.total_points + points,
+                    "lifetime_points": Points.lifetime_points + points,
+                    "points_last_1d": Points.points_last_1d + points,
+                    "points_last_7d": Points.points_last_7d + points,
+                    "points_last_30d": Points.points_last_30d + points,
+                    "points_to_next_level": Points.current_level * Points.current_level * 100 - (Points.total_points + points),
+                    "updated_at": utc_now()
+                }
+            ).returning(Points.id, Points.total_points, Points.current_level)
             
-            # Update points
-            student_points.total_points += points
-            student_points.lifetime_points += points
+            student_points = (await self.db.execute(stmt)).one()
             
             # Check for level up
-            level_up = await self._check_level_up(student_points)
+            new_level = self._calculate_level(student_points.total_points)
+            level_up = new_level > student_points.current_level
+            current_level = new_level if level_up else student_points.current_level
+            
+            if level_up:
+                await self.db.execute(
+                    update(Points)
+                    .where(Points.id == student_points.id)
+                    .values(
+                        current_level=new_level,
+                        points_to_next_level=new_level * new_level * 100 - student_points.total_points
+                    )
+                )
             
             # Create history record
-            history = PointHistory(
-                student_id=student_id,
-                points_id=student_points.id,
-                points_awarded=points,
-                reason=reason,
-                concept_id=concept_id
+            await self.db.execute(
+                insert(PointHistory).values(
+                    student_id=student_id,
+                    points_id=str(student_points.id),
+                    points_awarded=points,
+                    reason=reason,
+                    concept_id=concept_id
+                )
             )
-            self.db.add(history)
-            
-            await self.db.commit()
             
             result = {
                 "points_awarded": points,
                 "total_points": student_points.total_points,
-                "current_level": student_points.current_level,
+                "current_level": current_level,
                 "level_up": level_up
             }
             
@@ -68,56 +134,177 @@ class PointsEngine:
             
         except Exception as e:
             logger.error("Failed to award points", error=str(e))
-            await self.db.rollback()
             raise
     
-    async def calculate_event_points(self, event_type: str, metadata: Dict[str, Any] = None) -> int:
-        """Calculate points for different events."""
-        points_map = {
-            "concept_started": settings.POINTS_CONCEPT_STARTED,
-            "concept_completed": settings.POINTS_CONCEPT_COMPLETED,
-            "concept_mastered": settings.POINTS_CONCEPT_MASTERED,
-            "daily_streak": settings.POINTS_DAILY_STREAK,
-            "weekly_goal": settings.POINTS_WEEKLY_GOAL,
-        }
+    async def award_points_bulk(self, items: List[AwardItem]) -> Dict[str, Dict[str, Any]]:
+        """Award a batch of points with one upsert and one history insert.
         
-        base_points = points_map.get(event_type, 0)
+        Runs in the caller's transaction; the caller commits.
+        """
+        if not items:
+            return {}
         
-        # Add bonuses
-        if event_type == "concept_mastered" and metadata:
-            if metadata.get("perfect_score"):
-                base_points += settings.POINTS_PERFECT_SCORE_BONUS
+        # Pre-aggregate per-student deltas so each student is upserted once
+        totals: Dict[str, int] = defaultdict(int)
+        for item in items:
+            totals[str(item.student_id)] += item.points
+        
+        try:
+            stmt = pg_insert(Points).values([
+                {
+                    "student_id": student_id,
+                    "total_points": total,
+                    "lifetime_points": total,
+                    "points_last_1d": total,
+                    "points_last_7d": total,
+                    "points_last_30d": total,
+                    "current_level": 1,
+                    "points_to_next_level": 100 - total
+                }
+                for student_id, total in totals.items()
+            ])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["student_id"],
+                set_={
+                    "total_points": Points.total_points + stmt.excluded.total_points,
+                    "lifetime_points": Points.lifetime_points + stmt.excluded.lifetime_points,
+                    "points_last_1d": Points.points_last_1d + stmt.excluded.points_last_1d,
+                    "points_last_7d": Points.points_last_7d + stmt.excluded.points_last_7d,
+                    "points_last_30d": Points.points_last_30d + stmt.excluded.points_last_30d,
+                    "points_to_next_level": (
+                        Points.current_level * Points.current_level * 100
+                        - (Points.total_points + stmt.excluded.total_points)
+                    ),
+                    "updated_at": utc_now()
+                }
+            ).returning(Points.id, Points.student_id, Points.total_points, Points.current_level)
             
-            # Speed bonus
-            if metadata.get("completion_time") and metadata["completion_time"] < 300:  # 5 minutes
-                base_points += 5
+            rows = (await self.db.execute(stmt)).all()
+            
+            summary: Dict[str, Dict[str, Any]] = {}
+            level_ups = []
+            points_ids = {}
+            for row in rows:
+                student_id = str(row.student_id)
+                points_ids[student_id] = str(row.id)
+                new_level = self._calculate_level(row.total_points)
+                level_up = new_level > row.current_level
+                if level_up:
+                    level_ups.append({
+                        "b_id": row.id,
+                        "b_level": new_level,
+                        "b_to_next": new_level * new_level * 100 - row.total_points
+                    })
+                summary[student_id] = {
+                    "points_awarded": totals[student_id],
+                    "total_points": row.total_points,
+                    "current_level": new_level if level_up else row.current_level,
+                    "level_up": level_up
+                }
+            
+            if level_ups:
+                points_table = Points.__table__
+                await self.db.execute(
+                    update(points_table)
+                    .where(points_table.c.id == bindparam("b_id"))
+                    .values(
+                        current_level=bindparam("b_level"),
+                        points_to_next_level=bindparam("b_to_next")
+                    ),
+                    level_ups
+                )
+            
+            await self.db.execute(
+                insert(PointHistory),
+                [
+                    {
+                        "student_id": item.student_id,
+                        "points_id": points_ids[str(item.student_id)],
+                        "points_awarded": item.points,
+                        "reason": item.reason,
+                        "concept_id": item.concept_id
+                    }
+                    for item in items
+                ]
+            )
+            
+        except Exception as e:
+            logger.error("Failed to award points in bulk", error=str(e), items=len(items))
+            raise
         
-        return base_points
+        logger.info("Points awarded in bulk", students=len(summary), items=len(items))
+        
+        return summary
     
-    async def _get_or_create_points(self, student_id: str) -> Points:
-        """Get or create points record for student."""
+    async def refresh_rolling_points(self) -> int:
+        """Recompute the rolling-window totals from point history.
+        
+        Awards only ever add to the rolling columns, so this drops points
+        that have aged out of each window. run_rolling_points_refresh calls
+        it on a timer; the caller commits.
+        """
+        now = utc_now()
+        values = {
+            column: func.coalesce(
+                select(func.sum(PointHistory.points_awarded))
+                .where(
+                    PointHistory.student_id == Points.student_id,
+                    PointHistory.awarded_at >= now - timedelta(days=days)
+                )
+                .scalar_subquery(),
+                0
+            )
+            for column, days in ROLLING_WINDOWS.items()
+        }
+        
+        # Rewrite rows with something left to decay, plus any with recent
+        # history still at zero (e.g. rows that predate the rolling columns)
+        recent_students = (
+            select(PointHistory.student_id)
+            .where(PointHistory.awarded_at >= now - timedelta(days=max(ROLLING_WINDOWS.values())))
+        )
         result = await self.db.execute(
-            select(Points).where(Points.student_id == student_id)
+            update(Points)
+            .where(or_(Points.points_last_30d > 0, Points.student_id.in_(recent_students)))
+            .values(**values)
+            .execution_options(synchronize_session=False)
         )
-        points = result.scalar_one_or_none()
         
-        if not points:
-            points = Points(student_id=student_id)
-            self.db.add(points)
-            await self.db.flush()
+        logger.info("Rolling points refreshed", students=result.rowcount)
         
-        return points
+        return result.rowcount
     
-    async def _check_level_up(self, points: Points) -> bool:
-        """Check if student leveled up."""
-        # Simple level calculation: level = sqrt(total_points / 100)
-        import math
-        new_level = int(math.sqrt(points.total_points / 100)) + 1
+    def calculate_event_points(self, event_type: str, metadata: Dict[str, Any] = None) -> int:
+        """Calculate points for different events."""
+        base_points = _POINTS_MAP.get(event_type, 0)
         
-        if new_level > points.current_level:
-            points.current_level = new_level
-            points.points_to_next_level = (new_level ** 2) * 100 - points.total_points
-            return True
+        # Add bonuses
+        if event_type == "concept_mastered" and metadata:
+            if metadata.get("perfect_score"):
+                base_points += _PERFECT_SCORE_BONUS
+            
+            # Speed bonus
+            completion_time = metadata.get("completion_time")
+            if completion_time and completion_time < _SPEED_BONUS_THRESHOLD:
+                base_points += _SPEED_BONUS
+        
+        return base_points
+    
+    @staticmethod
+    def _calculate_level(total_points: int) -> int:
+        """Get the level for a points total."""
+        # Simple level calculation: level = isqrt(total_points / 100) + 1
+        return isqrt(total_points // 100) + 1
+
+
+async def run_rolling_points_refresh(interval: int) -> None:
+    """Refresh the rolling leaderboard columns every interval seconds until cancelled."""
+    while True:
+        try:
+            async with AsyncSessionLocal() as session:
+                await PointsEngine(session).refresh_rolling_points()
+                await session.commit()
+        except Exception as e:
+            logger.error("Rolling points refresh failed", error=str(e))
         
-        points.points_to_next_level = (points.current_level ** 2) * 100 - points.total_points
-        return False
\ No newline at end of file
+        await asyncio.sleep(interval)
\ No newline at end of file
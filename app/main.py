@@ -1,25 +1,33 @@
 """Main FastAPI application for Progress Service."""
 
+import asyncio
 import os
+import time
 from contextlib import asynccontextmanager
 from typing import Dict, Any
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
+from sqlalchemy import text
 import structlog
 from prometheus_fastapi_instrumentator import Instrumentator
 
 from app.core.config import settings
 from app.core.logging import setup_logging
-from app.core.database import init_db, get_db
-from app.core.dependencies import get_redis_cache
+from app.core.database import init_db, engine
+from app.core.dependencies import get_redis_cache, close_http_client
+from app.gamification.points_engine import run_rolling_points_refresh
+from app.notifications.dispatcher import notification_dispatcher
 from app.routers import progress, gamification, analytics, notifications, dashboard
 
 # Setup structured logging
 setup_logging()
 logger = structlog.get_logger()
 
+# Seconds a dependency health verdict is reused before re-probing
+HEALTH_CHECK_INTERVAL = 5
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -35,11 +43,16 @@ async def lifespan(app: FastAPI):
     
     # Store in app state
     app.state.redis_cache = redis_cache
+    app.state.health_cache = {}
+    
+    # Start the notification send workers
+    await notification_dispatcher.start()
     
-    # Setup Prometheus metrics
-    if settings.ENABLE_METRICS:
-        instrumentator = Instrumentator()
-        instrumentator.instrument(app).expose(app, endpoint="/metrics")
+    # Age expired points out of the rolling leaderboards in the background
+    rolling_refresh = asyncio.create_task(
+        run_rolling_points_refresh(settings.LEADERBOARD_REFRESH_INTERVAL),
+        name="rolling-points-refresh"
+    )
     
     logger.info("Progress service initialized successfully")
     
@@ -47,6 +60,10 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down Spool Progress Service")
+    rolling_refresh.cancel()
+    await asyncio.gather(rolling_refresh, return_exceptions=True)
+    await notification_dispatcher.stop()
+    await close_http_client()
 
 
 # Create FastAPI app
@@ -55,10 +72,18 @@ app = FastAPI(
     description="Progress tracking, gamification, and analytics for the Spool platform",
     version=settings.APP_VERSION,
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     docs_url="/docs" if settings.ENVIRONMENT != "production" else None,
     redoc_url="/redoc" if settings.ENVIRONMENT != "production" else None,
 )
 
+# Setup Prometheus metrics, leaving probe and scrape traffic out of the histograms
+if settings.ENABLE_METRICS:
+    Instrumentator(
+        excluded_handlers=["/metrics", "/health"],
+        should_instrument_requests_inprogress=True
+    ).instrument(app).expose(app, endpoint="/metrics", include_in_schema=False)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -97,22 +122,37 @@ async def health_check(request: Request):
         "checks": {}
     }
     
+    health_cache = getattr(request.app.state, "health_cache", {})
+    now = time.monotonic()
+    
     # Check database
-    try:
-        async for db in get_db():
-            await db.execute("SELECT 1")
-            health_status["checks"]["database"] = "healthy"
-    except Exception as e:
-        health_status["checks"]["database"] = f"unhealthy: {str(e)}"
-        health_status["status"] = "degraded"
+    checked_at, verdict = health_cache.get("database", (0.0, None))
+    if verdict is None or now - checked_at >= HEALTH_CHECK_INTERVAL:
+        try:
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+            verdict = "healthy"
+        except Exception as e:
+            verdict = f"unhealthy: {str(e)}"
+        health_cache["database"] = (now, verdict)
+    health_status["checks"]["database"] = verdict
     
     # Check Redis
-    try:
-        if hasattr(request.app.state, "redis_cache"):
-            await request.app.state.redis_cache.exists("health_check")
-            health_status["checks"]["redis"] = "healthy"
-    except Exception as e:
-        health_status["checks"]["redis"] = f"unhealthy: {str(e)}"
+    if hasattr(request.app.state, "redis_cache"):
+        checked_at, verdict = health_cache.get("redis", (0.0, None))
+        if verdict is None or now - checked_at >= HEALTH_CHECK_INTERVAL:
+            try:
+                # PING the Redis client directly; the in-memory fallback has no client
+                client = getattr(request.app.state.redis_cache, "client", None)
+                if client is not None:
+                    await client.ping()
+                verdict = "healthy"
+            except Exception as e:
+                verdict = f"unhealthy: {str(e)}"
+            health_cache["redis"] = (now, verdict)
+        health_status["checks"]["redis"] = verdict
+    
+    if any(check != "healthy" for check in health_status["checks"].values()):
         health_status["status"] = "degraded"
     
     status_code = 200 if health_status["status"] == "healthy" else 503
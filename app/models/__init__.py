@@ -3,6 +3,7 @@
 from app.models.progress import Progress, ConceptProgress, LearningPath
 from app.models.gamification import Points, Badge, UserBadge, Streak, Achievement
 from app.models.analytics import Analytics, LearningMetrics, ProgressSnapshot
+from app.models.notification import NotificationLog
 
 __all__ = [
     "Progress",
@@ -15,5 +16,6 @@ __all__ = [
     "Achievement",
     "Analytics",
     "LearningMetrics",
-    "ProgressSnapshot"
+    "ProgressSnapshot",
+    "NotificationLog"
 ]
\ No newline at end of file
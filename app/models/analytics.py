@@ -1,22 +1,21 @@
 """Analytics and reporting models."""
 
-from datetime import datetime, date
 from typing import Optional
 from sqlalchemy import Column, String, Integer, Float, DateTime, Boolean, ForeignKey, Index, Date, JSON
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 
-from app.core.database import Base
+from app.core.database import Base, utc_now
 
 
 class Analytics(Base):
     """Aggregated analytics for students."""
     __tablename__ = "analytics"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    student_id = Column(UUID(as_uuid=True), nullable=False, index=True)
-    period = Column(String, nullable=False)  # daily, weekly, monthly
+    id = Column(UUID(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4()))
+    student_id = Column(UUID(as_uuid=False), nullable=False, index=True)
+    period = Column(String(32), nullable=False)  # daily, weekly, monthly
     period_date = Column(Date, nullable=False)
     concepts_started = Column(Integer, default=0)
     concepts_completed = Column(Integer, default=0)
@@ -25,10 +24,10 @@ class Analytics(Base):
     average_score = Column(Float, default=0.0)
     points_earned = Column(Integer, default=0)
     badges_earned = Column(Integer, default=0)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, server_default=utc_now())
     
     __table_args__ = (
-        Index("ix_analytics_student_period", "student_id", "period", "period_date"),
+        Index("ix_analytics_student_period", "student_id", "period", "period_date", unique=True),
     )
 
 
@@ -38,14 +37,14 @@ class LearningMetrics(Base):
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     student_id = Column(UUID(as_uuid=True), nullable=False, index=True)
-    metric_type = Column(String, nullable=False)  # velocity, accuracy, consistency
+    metric_type = Column(String(32), nullable=False)  # velocity, accuracy, consistency
     metric_value = Column(Float, nullable=False)
     subject = Column(String)
-    calculated_at = Column(DateTime, default=datetime.utcnow)
-    metadata = Column(JSON)  # Additional metric data
+    calculated_at = Column(DateTime, server_default=utc_now())
+    metadata_ = Column("metadata", JSON)  # Additional metric data
     
     __table_args__ = (
-        Index("ix_metrics_student_type", "student_id", "metric_type"),
+        Index("ix_metrics_student_type_calculated", student_id, metric_type, calculated_at.desc()),
     )
 
 
@@ -63,7 +62,7 @@ class ProgressSnapshot(Base):
     strongest_subjects = Column(JSON)  # Array of subjects
     weakest_subjects = Column(JSON)  # Array of subjects
     recommendations = Column(JSON)  # AI-generated recommendations
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, server_default=utc_now())
     
     __table_args__ = (
         Index("ix_snapshot_student_date", "student_id", "snapshot_date"),
@@ -1,6 +1,6 @@
 """Gamification models."""
 
-from datetime import datetime, date
+from datetime import date
 from enum import Enum
 from typing import Optional
 from sqlalchemy import Column, String, Integer, Float, DateTime, Boolean, ForeignKey, UniqueConstraint, Index, Date, JSON
@@ -8,7 +8,7 @@ from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 
-from app.core.database import Base
+from app.core.database import Base, utc_now
 
 
 class BadgeCategory(str, Enum):
@@ -31,30 +31,49 @@ class Points(Base):
     current_level = Column(Integer, default=1)
     points_to_next_level = Column(Integer, default=100)
     lifetime_points = Column(Integer, default=0)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Rolling-window totals for the leaderboard, incremented on award and
+    # recomputed from point_history by PointsEngine.refresh_rolling_points
+    points_last_1d = Column(Integer, default=0, server_default="0", nullable=False)
+    points_last_7d = Column(Integer, default=0, server_default="0", nullable=False)
+    points_last_30d = Column(Integer, default=0, server_default="0", nullable=False)
+    created_at = Column(DateTime, server_default=utc_now())
+    updated_at = Column(DateTime, server_default=utc_now(), onupdate=utc_now())
+    
+    __mapper_args__ = {"eager_defaults": True}
     
     # Relationships
     point_history = relationship("PointHistory", back_populates="student_points")
+    
+    __table_args__ = (
+        Index("ix_points_last_1d_desc", points_last_1d.desc()),
+        Index("ix_points_last_7d_desc", points_last_7d.desc()),
+        Index("ix_points_last_30d_desc", points_last_30d.desc()),
+    )
 
 
 class PointHistory(Base):
     """History of point awards."""
     __tablename__ = "point_history"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    student_id = Column(UUID(as_uuid=True), nullable=False, index=True)
-    points_id = Column(UUID(as_uuid=True), ForeignKey("points.id"))
+    id = Column(UUID(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4()))
+    student_id = Column(UUID(as_uuid=False), nullable=False, index=True)
+    points_id = Column(UUID(as_uuid=False), ForeignKey("points.id"))
     points_awarded = Column(Integer, nullable=False)
     reason = Column(String, nullable=False)
-    concept_id = Column(UUID(as_uuid=True))
-    awarded_at = Column(DateTime, default=datetime.utcnow)
+    concept_id = Column(UUID(as_uuid=False))
+    awarded_at = Column(DateTime, server_default=utc_now())
     
     # Relationships
     student_points = relationship("Points", back_populates="point_history")
     
     __table_args__ = (
-        Index("ix_point_history_student_date", "student_id", "awarded_at"),
+        Index(
+            "ix_point_history_student_date",
+            "student_id",
+            "awarded_at",
+            "id",
+            postgresql_include=["points_awarded"]
+        ),
     )
 
 
@@ -65,12 +84,12 @@ class Badge(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String, nullable=False, unique=True)
     description = Column(String, nullable=False)
-    category = Column(String, nullable=False)
+    category = Column(String(32), nullable=False)
     icon_url = Column(String)
     points_value = Column(Integer, default=0)
     criteria = Column(JSON, nullable=False)  # JSON criteria for earning
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, server_default=utc_now())
     
     # Relationships
     user_badges = relationship("UserBadge", back_populates="badge")
@@ -83,7 +102,7 @@ class UserBadge(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     student_id = Column(UUID(as_uuid=True), nullable=False, index=True)
     badge_id = Column(UUID(as_uuid=True), ForeignKey("badges.id"))
-    earned_at = Column(DateTime, default=datetime.utcnow)
+    earned_at = Column(DateTime, server_default=utc_now())
     progress = Column(Float, default=0.0)  # For progressive badges
     
     # Relationships
@@ -92,6 +111,7 @@ class UserBadge(Base):
     __table_args__ = (
         UniqueConstraint("student_id", "badge_id"),
         Index("ix_user_badge_earned", "earned_at"),
+        Index("ix_user_badge_student_earned", student_id, earned_at.desc()),
     )
 
 
@@ -106,8 +126,14 @@ class Streak(Base):
     last_activity_date = Column(Date, default=date.today)
     streak_started_date = Column(Date)
     total_active_days = Column(Integer, default=0)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=utc_now())
+    updated_at = Column(DateTime, server_default=utc_now(), onupdate=utc_now())
+    
+    __mapper_args__ = {"eager_defaults": True}
+    
+    __table_args__ = (
+        Index("ix_streak_current_desc", current_streak.desc()),
+    )
 
 
 class Achievement(Base):
@@ -116,12 +142,15 @@ class Achievement(Base):
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     student_id = Column(UUID(as_uuid=True), nullable=False, index=True)
-    achievement_type = Column(String, nullable=False)
+    achievement_type = Column(String(32), nullable=False)
     achievement_name = Column(String, nullable=False)
     description = Column(String)
-    metadata = Column(JSON)  # Additional achievement data
-    achieved_at = Column(DateTime, default=datetime.utcnow)
+    metadata_ = Column("metadata", JSON)  # Additional achievement data
+    achieved_at = Column(DateTime, server_default=utc_now())
+    
+    __mapper_args__ = {"eager_defaults": True}
     
     __table_args__ = (
         Index("ix_achievement_student_type", "student_id", "achievement_type"),
+        Index("ix_achievement_student_achieved", student_id, achieved_at.desc()),
     )
\ No newline at end of file
@@ -0,0 +1,25 @@
+"""Notification audit models."""
+
+from sqlalchemy import Column, String, DateTime, Index, JSON
+from sqlalchemy.dialects.postgresql import UUID
+import uuid
+
+from app.core.database import Base, utc_now
+
+
+class NotificationLog(Base):
+    """Audit log of published notifications."""
+    __tablename__ = "notification_log"
+    
+    id = Column(UUID(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4()))
+    student_id = Column(UUID(as_uuid=False), nullable=False)
+    notification_type = Column(String(32), nullable=False)
+    title = Column(String, nullable=False)
+    message = Column(String, nullable=False)
+    data = Column(JSON)
+    sent_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, server_default=utc_now())
+    
+    __table_args__ = (
+        Index("ix_notification_log_student_sent", "student_id", "sent_at"),
+    )
\ No newline at end of file
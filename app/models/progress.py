@@ -1,14 +1,13 @@
 """Progress tracking models."""
 
-from datetime import datetime
-from enum import Enum
+from enum import Enum, IntEnum
 from typing import Optional
-from sqlalchemy import Column, String, Integer, Float, DateTime, Boolean, ForeignKey, UniqueConstraint, Index
+from sqlalchemy import Column, String, Integer, Float, DateTime, Boolean, ForeignKey, UniqueConstraint, Index, Text, Computed, text, SmallInteger, TypeDecorator
 from sqlalchemy.orm import relationship
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import UUID, JSONB
 import uuid
 
-from app.core.database import Base
+from app.core.database import Base, utc_now
 
 
 class ProgressStatus(str, Enum):
@@ -19,6 +18,30 @@ class ProgressStatus(str, Enum):
     MASTERED = "mastered"
 
 
+class ProgressStatusCode(IntEnum):
+    """SMALLINT storage codes for ProgressStatus."""
+    NOT_STARTED = 0
+    IN_PROGRESS = 1
+    COMPLETED = 2
+    MASTERED = 3
+
+
+class ProgressStatusType(TypeDecorator):
+    """Store ProgressStatus values as SMALLINT codes, exposing the string values."""
+    impl = SmallInteger
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return ProgressStatusCode[ProgressStatus(value).name].value
+    
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return ProgressStatus[ProgressStatusCode(value).name].value
+
+
 class Progress(Base):
     """Overall progress tracking for students."""
     __tablename__ = "progress"
@@ -30,15 +53,18 @@ class Progress(Base):
     total_concepts_mastered = Column(Integer, default=0)
     total_time_spent = Column(Integer, default=0)  # seconds
     average_score = Column(Float, default=0.0)
-    last_activity = Column(DateTime, default=datetime.utcnow)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    last_activity = Column(DateTime, server_default=utc_now())
+    created_at = Column(DateTime, server_default=utc_now())
+    updated_at = Column(DateTime, server_default=utc_now(), onupdate=utc_now())
+    
+    __mapper_args__ = {"eager_defaults": True}
     
     # Relationships
     concept_progress = relationship("ConceptProgress", back_populates="student_progress")
     
     __table_args__ = (
         Index("ix_progress_student_activity", "student_id", "last_activity"),
+        Index("ix_progress_mastered_desc", total_concepts_mastered.desc()),
     )
 
 
@@ -50,15 +76,20 @@ class ConceptProgress(Base):
     student_id = Column(UUID(as_uuid=True), nullable=False, index=True)
     concept_id = Column(UUID(as_uuid=True), nullable=False, index=True)
     progress_id = Column(UUID(as_uuid=True), ForeignKey("progress.id"))
-    status = Column(String, default=ProgressStatus.NOT_STARTED.value)
+    status = Column(ProgressStatusType, default=ProgressStatus.NOT_STARTED.value)
     attempts = Column(Integer, default=0)
     best_score = Column(Float, default=0.0)
     last_score = Column(Float, default=0.0)
+    current_score = Column(Float)
     time_spent = Column(Integer, default=0)  # seconds
     started_at = Column(DateTime)
     completed_at = Column(DateTime)
     mastered_at = Column(DateTime)
-    last_accessed = Column(DateTime, default=datetime.utcnow)
+    last_attempted_at = Column(DateTime)
+    last_accessed = Column(DateTime, server_default=utc_now())
+    created_at = Column(DateTime, server_default=utc_now())
+    metadata_ = Column("metadata", JSONB)  # Concept context, e.g. subject
+    subject = Column(Text, Computed("metadata->>'subject'", persisted=True))
     
     # Relationships
     student_progress = relationship("Progress", back_populates="concept_progress")
@@ -67,6 +98,37 @@ class ConceptProgress(Base):
         UniqueConstraint("student_id", "concept_id"),
         Index("ix_concept_progress_status", "status"),
         Index("ix_concept_progress_student_concept", "student_id", "concept_id"),
+        Index("ix_concept_progress_student_created", "student_id", "created_at"),
+        Index("ix_concept_progress_student_completed", "student_id", "completed_at"),
+        Index("ix_concept_progress_student_mastered", "student_id", "mastered_at"),
+        Index(
+            "ix_concept_progress_student_mastered_recent",
+            student_id,
+            mastered_at.desc(),
+            postgresql_where=text(f"status = {ProgressStatusCode.MASTERED.value}"),
+            postgresql_include=["id"]
+        ),
+        Index(
+            "ix_concept_progress_student_last_attempted",
+            student_id,
+            last_attempted_at.desc(),
+            postgresql_include=["id", "attempts", "time_spent"]
+        ),
+        Index(
+            "ix_concept_progress_student_status_completed",
+            "student_id",
+            "status",
+            "completed_at",
+            postgresql_include=["current_score", "attempts"]
+        ),
+        Index(
+            "ix_concept_progress_student_status_mastered",
+            "student_id",
+            "status",
+            "mastered_at",
+            postgresql_include=["current_score", "attempts"]
+        ),
+        Index("ix_concept_progress_student_subject", "student_id", "subject"),
     )
 
 
@@ -84,8 +146,10 @@ class LearningPath(Base):
     current_concept_id = Column(UUID(as_uuid=True))
     progress_percentage = Column(Float, default=0.0)
     estimated_completion_date = Column(DateTime)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=utc_now())
+    updated_at = Column(DateTime, server_default=utc_now(), onupdate=utc_now())
+    
+    __mapper_args__ = {"eager_defaults": True}
     
     __table_args__ = (
         Index("ix_learning_path_student_subject", "student_id", "subject"),
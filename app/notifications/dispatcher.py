@@ -0,0 +1,83 @@
+"""Long-lived worker queue for notification sends."""
+
+from typing import Any, Awaitable, Callable, List, Optional
+import asyncio
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+# Seconds shutdown waits for queued sends before cancelling the workers
+DRAIN_TIMEOUT = 10
+
+
+class NotificationDispatcher:
+    """Run notification sends on a fixed pool of app-lifetime workers.
+    
+    Handlers enqueue a coroutine function and its arguments instead of
+    scheduling a BackgroundTasks entry per send, so bursts are absorbed by a
+    bounded queue and drained at a steady concurrency.
+    """
+    
+    def __init__(self, workers: int, max_size: int):
+        self.workers = workers
+        self.max_size = max_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+    
+    async def start(self) -> None:
+        """Create the queue and start the workers on the running loop."""
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"notification-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info("Notification dispatcher started", workers=self.workers)
+    
+    async def stop(self) -> None:
+        """Let queued sends finish, up to DRAIN_TIMEOUT, then stop the workers."""
+        if self._queue is None:
+            return
+        
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("Notification queue not drained", pending=self._queue.qsize())
+        
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+    
+    def submit(self, send: Callable[..., Awaitable[Any]], *args: Any) -> bool:
+        """Queue a send; returns False if it was dropped because the queue is full or stopped."""
+        if self._queue is None:
+            logger.warning("Notification dispatcher not running, dropping send")
+            return False
+        
+        try:
+            self._queue.put_nowait((send, args))
+        except asyncio.QueueFull:
+            # Notifications are best effort; shed load rather than block the request
+            logger.warning("Notification queue full, dropping send", size=self.max_size)
+            return False
+        return True
+    
+    async def _worker(self) -> None:
+        """Await queued sends one at a time until cancelled."""
+        while True:
+            send, args = await self._queue.get()
+            try:
+                await send(*args)
+            except Exception as e:
+                logger.error("Queued notification send failed", error=str(e))
+            finally:
+                self._queue.task_done()
+
+
+notification_dispatcher = NotificationDispatcher(
+    workers=settings.NOTIFICATION_WORKERS,
+    max_size=settings.NOTIFICATION_QUEUE_SIZE
+)
\ No newline at end of file
@@ -1,24 +1,132 @@
 """Notification engine for progress updates."""
 
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, AsyncIterator, Final, List, Mapping, NamedTuple, Optional, Tuple
+from types import MappingProxyType
+from collections import Counter
 from datetime import datetime, date, timedelta
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
-import json
+import asyncio
+import time
+from string import Formatter
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy import select, insert, and_, exists, func
+import orjson
 import structlog
 
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
 from app.core.messaging import send_message
 from app.models.progress import Progress, ConceptProgress, ProgressStatus
-from app.models.gamification import Points, Streak, UserBadge
+from app.models.gamification import Points, PointHistory, Streak, Badge, UserBadge
+from app.models.notification import NotificationLog
+from app.notifications.dispatcher import notification_dispatcher
 
 logger = structlog.get_logger()
 
+WEEKLY_GOAL = 5  # Default weekly mastered-concepts goal
+NOTIFICATION_TOPIC = "progress-notifications"
+REMINDER_STREAM_CHUNK_SIZE = 1000  # Students fetched per server-side cursor round trip
+_ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z
+
+
+# Preferences used until they are stored per student
+_DEFAULT_PREFERENCES = {
+    "email_enabled": True,
+    "push_enabled": True,
+    "notification_types": {
+        "progress_updates": True,
+        "badges_earned": True,
+        "milestones": True,
+        "reminders": True,
+        "weekly_summary": True
+    },
+    "quiet_hours": {
+        "enabled": True,
+        "start": 22,
+        "end": 8
+    }
+}
+
+PREFERENCES_CACHE_TTL = 300  # 5 minutes
+PREFERENCES_CACHE_SIZE = 10_000
+
+# student_id -> (loaded_at, preferences)
+_preferences_cache: Dict[str, tuple] = {}
+
+_DEFAULT_CATEGORY = "progress_updates"
+
+_CATEGORY_MAP: Final[Mapping[str, str]] = MappingProxyType({
+    "concept_completed": "progress_updates",
+    "concept_mastered": "progress_updates",
+    "badge_earned": "badges_earned",
+    "level_up": "milestones",
+    "streak_milestone": "milestones",
+    "daily_reminder": "reminders",
+    "weekly_summary": "weekly_summary"
+})
+
+# event_type -> (title, message)
+_TEMPLATES: Final[Mapping[str, Tuple[str, str]]] = MappingProxyType({
+    "concept_completed": (
+        "Concept Completed!",
+        "Great job! You've completed '{concept_name}'."
+    ),
+    "concept_mastered": (
+        "Concept Mastered!",
+        "Excellent! You've mastered '{concept_name}' with a score of {score}%!"
+    ),
+    "badge_earned": (
+        "New Badge Earned!",
+        "Congratulations! You've earned the '{badge_name}' badge!"
+    ),
+    "level_up": (
+        "Level Up!",
+        "Amazing! You've reached level {level}!"
+    )
+})
+
+_DEFAULT_TEMPLATE: Final = ("Progress Update", "You've made progress in your learning journey!")
+
+
+# Placeholder names per template; parsing at import time rejects malformed templates early
+_TEMPLATE_FIELDS = {
+    event_type: frozenset(
+        field for _, field, _, _ in Formatter().parse(message) if field
+    )
+    for event_type, (_, message) in _TEMPLATES.items()
+}
+
+
+class _SafeDict(dict):
+    """Format mapping that leaves missing placeholders untouched."""
+    
+    def __missing__(self, key: str) -> str:
+        return "{" + key + "}"
+
+
+class ReminderState(NamedTuple):
+    """Per-student inputs for the reminder checks."""
+    active_today: bool
+    current_streak: Optional[int]
+    last_activity_date: Optional[date]
+    mastered_this_week: int
+
 
 class NotificationEngine:
     """Engine for managing and sending notifications."""
     
-    def __init__(self, db: AsyncSession):
+    def __init__(
+        self,
+        db: AsyncSession,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+        notification_buffer: Optional[List[Dict[str, Any]]] = None,
+        now: Optional[datetime] = None
+    ):
         self.db = db
+        self.session_factory = session_factory
+        # When set, notifications are collected here and published by flush_notifications
+        self.notification_buffer = notification_buffer
+        # When set, every notification from this engine is stamped with this time
+        self.now = now
     
     async def send_progress_update(
         self,
@@ -28,25 +136,25 @@ class NotificationEngine:
     ) -> bool:
         """Send progress update notification based on event."""
         try:
-            # Get student preferences (simplified - would fetch from DB)
-            preferences = await self._get_notification_preferences(student_id)
+            # Get student preferences and the event's template concurrently
+            preferences, template = await asyncio.gather(
+                self._get_notification_preferences(student_id),
+                self._get_template(event_type)
+            )
             
             if not self._should_send_notification(event_type, preferences):
                 return False
             
             # Generate notification content
-            notification = self._generate_notification(event_type, event_data)
+            notification = self._generate_notification(event_type, event_data, template)
             
-            # Send notification
-            await self._send_notification(
-                student_id=student_id,
-                notification_type=event_type,
-                title=notification["title"],
-                message=notification["message"],
-                data=event_data
-            )
+            args = (student_id, event_type, notification["title"], notification["message"], event_data)
             
-            return True
+            if self.notification_buffer is not None:
+                return await self._send_notification(*args)
+            
+            # Publish on the app's notification workers so the caller does not wait on the broker
+            return notification_dispatcher.submit(self._send_notification, *args)
             
         except Exception as e:
             logger.error(
@@ -57,31 +165,38 @@ class NotificationEngine:
             )
             return False
     
-    async def send_daily_reminder(self, student_id: str) -> bool:
+    async def send_daily_reminder(self, student_id: str, today: Optional[date] = None) -> bool:
         """Send daily practice reminder."""
+        today = today or date.today()
+        
         # Check if student has been active today
         result = await self.db.execute(
-            select(ConceptProgress).where(
-                and_(
-                    ConceptProgress.student_id == student_id,
-                    ConceptProgress.last_attempted_at >= date.today()
+            select(
+                exists().where(
+                    and_(
+                        ConceptProgress.student_id == student_id,
+                        ConceptProgress.last_attempted_at >= today
+                    )
                 )
-            ).limit(1)
+            )
         )
         
-        if result.scalar_one_or_none():
+        if result.scalar():
             # Already active today
             return False
         
         # Get streak info
         streak_result = await self.db.execute(
-            select(Streak).where(Streak.student_id == student_id)
+            select(Streak.current_streak).where(Streak.student_id == student_id)
         )
-        streak = streak_result.scalar_one_or_none()
+        current_streak = streak_result.scalar_one_or_none() or 0
         
-        # Generate reminder message
-        if streak and streak.current_streak > 0:
-            message = f"Don't break your {streak.current_streak}-day streak! Time for today's practice."
+        return await self._send_daily_reminder(student_id, current_streak)
+    
+    async def _send_daily_reminder(self, student_id: str, current_streak: int) -> bool:
+        """Send daily reminder notification for an already-loaded streak."""
+        if current_streak > 0:
+            message = f"Don't break your {current_streak}-day streak! Time for today's practice."
         else:
             message = "Ready to learn something new today? Your next concept is waiting!"
         
@@ -90,61 +205,65 @@ class NotificationEngine:
             notification_type="daily_reminder",
             title="Daily Learning Reminder",
             message=message,
-            data={"streak": streak.current_streak if streak else 0}
+            data={"streak": current_streak}
         )
         
         return True
     
-    async def send_weekly_summary(self, student_id: str) -> bool:
+    async def send_weekly_summary(self, student_id: str, today: Optional[date] = None) -> bool:
         """Send weekly progress summary."""
         # Calculate weekly stats
-        week_start = date.today() - timedelta(days=7)
-        
-        # Get concepts progress
-        concepts_result = await self.db.execute(
-            select(
-                func.count(ConceptProgress.id).filter(
-                    ConceptProgress.created_at >= week_start
-                ).label("started"),
-                func.count(ConceptProgress.id).filter(
-                    and_(
-                        ConceptProgress.status == ProgressStatus.MASTERED.value,
-                        ConceptProgress.mastered_at >= week_start
-                    )
-                ).label("mastered")
-            ).where(ConceptProgress.student_id == student_id)
-        )
-        concepts = concepts_result.one()
+        week_start = (today or date.today()) - timedelta(days=7)
         
-        # Get points earned
-        points_result = await self.db.execute(
-            select(func.sum(PointHistory.points_awarded)).where(
+        points_earned = (
+            select(func.coalesce(func.sum(PointHistory.points_awarded), 0))
+            .where(
                 and_(
                     PointHistory.student_id == student_id,
                     PointHistory.awarded_at >= week_start
                 )
             )
+            .scalar_subquery()
         )
-        points_earned = points_result.scalar() or 0
         
-        # Get badges earned
-        badges_result = await self.db.execute(
-            select(UserBadge).where(
+        badge_names = (
+            select(func.array_agg(Badge.name))
+            .join(UserBadge, UserBadge.badge_id == Badge.id)
+            .where(
                 and_(
                     UserBadge.student_id == student_id,
                     UserBadge.earned_at >= week_start
                 )
-            ).options(selectinload(UserBadge.badge))
+            )
+            .scalar_subquery()
+        )
+        
+        # Concept counts, points earned and badges earned in one round trip
+        result = await self.db.execute(
+            select(
+                func.count(ConceptProgress.id).filter(
+                    ConceptProgress.created_at >= week_start
+                ).label("started"),
+                func.count(ConceptProgress.id).filter(
+                    and_(
+                        ConceptProgress.status == ProgressStatus.MASTERED.value,
+                        ConceptProgress.mastered_at >= week_start
+                    )
+                ).label("mastered"),
+                points_earned.label("points_earned"),
+                badge_names.label("badge_names")
+            ).where(ConceptProgress.student_id == student_id)
         )
-        badges = badges_result.scalars().all()
+        stats = result.one()
+        badge_names = stats.badge_names or []
         
         # Generate summary
         summary = {
-            "concepts_started": concepts.started,
-            "concepts_mastered": concepts.mastered,
-            "points_earned": points_earned,
-            "badges_earned": len(badges),
-            "badge_names": [b.badge.name for b in badges]
+            "concepts_started": stats.started,
+            "concepts_mastered": stats.mastered,
+            "points_earned": stats.points_earned,
+            "badges_earned": len(badge_names),
+            "badge_names": badge_names
         }
         
         message = self._generate_weekly_summary_message(summary)
@@ -208,142 +327,135 @@ class NotificationEngine:
     
     async def check_and_send_reminders(self) -> Dict[str, int]:
         """Check all students and send appropriate reminders."""
-        sent_counts = {
-            "daily_reminders": 0,
-            "streak_warnings": 0,
-            "goal_reminders": 0
-        }
-        
-        # Get all active students
-        students_result = await self.db.execute(
-            select(Progress.student_id).distinct()
-        )
-        student_ids = [row[0] for row in students_result]
-        
-        for student_id in student_ids:
-            # Check for daily reminder
-            if await self._should_send_daily_reminder(student_id):
-                if await self.send_daily_reminder(student_id):
-                    sent_counts["daily_reminders"] += 1
+        sent_counts = Counter(daily_reminders=0, streak_warnings=0, goal_reminders=0)
+        
+        # Capture the clock once for the whole run
+        today = date.today()
+        now = datetime.utcnow()
+        
+        # One buffering engine for the run; its sends only append to the buffer
+        reminders = NotificationEngine(self.db, self.session_factory, [], now)
+        
+        # Stream every student's reminder inputs from one set-based query, one chunk at a time.
+        # Notifications are buffered per chunk and published in batches, so memory stays bounded.
+        async for states in self._stream_reminder_states(today):
+            # Only students with something to send need processing
+            pending = [
+                (student_id, state) for student_id, state in states
+                if self._should_send_daily_reminder(state)
+                or self._should_send_streak_warning(state, today)
+                or self._should_send_goal_reminder(state)
+            ]
+            if not pending:
+                continue
             
-            # Check for streak warning
-            if await self._should_send_streak_warning(student_id):
-                if await self._send_streak_warning(student_id):
-                    sent_counts["streak_warnings"] += 1
+            for student_id, state in pending:
+                try:
+                    await reminders._process_student(student_id, state, today, sent_counts)
+                except Exception as e:
+                    logger.error("Failed to process reminders", student_id=student_id, error=str(e))
             
-            # Check for goal reminder
-            if await self._should_send_goal_reminder(student_id):
-                if await self._send_goal_reminder(student_id):
-                    sent_counts["goal_reminders"] += 1
+            await self.flush_notifications(reminders.notification_buffer)
+            reminders.notification_buffer = []
         
-        return sent_counts
+        return dict(sent_counts)
+    
+    async def _process_student(
+        self,
+        student_id: str,
+        state: ReminderState,
+        today: date,
+        sent_counts: Counter
+    ) -> None:
+        """Buffer the reminders due for one student from its streamed state, without querying."""
+        # Check for daily reminder
+        if self._should_send_daily_reminder(state):
+            if await self._send_daily_reminder(student_id, state.current_streak or 0):
+                sent_counts["daily_reminders"] += 1
+        
+        # Check for streak warning
+        if self._should_send_streak_warning(state, today):
+            if await self._send_streak_warning(student_id, state.current_streak):
+                sent_counts["streak_warnings"] += 1
+        
+        # Check for goal reminder
+        if self._should_send_goal_reminder(state):
+            if await self._send_goal_reminder(student_id, state.mastered_this_week):
+                sent_counts["goal_reminders"] += 1
     
     async def _get_notification_preferences(self, student_id: str) -> Dict[str, Any]:
-        """Get notification preferences for student."""
+        """Get notification preferences for student, cached in-process for a short TTL."""
+        cached = _preferences_cache.get(student_id)
+        if cached is not None and time.monotonic() - cached[0] < PREFERENCES_CACHE_TTL:
+            return cached[1]
+        
+        preferences = await self._load_notification_preferences(student_id)
+        
+        if len(_preferences_cache) >= PREFERENCES_CACHE_SIZE:
+            # Evict the oldest entry
+            _preferences_cache.pop(next(iter(_preferences_cache)))
+        _preferences_cache[student_id] = (time.monotonic(), preferences)
+        return preferences
+    
+    async def _load_notification_preferences(self, student_id: str) -> Dict[str, Any]:
+        """Load notification preferences for student."""
         # In production, would fetch from database
-        return {
-            "email_enabled": True,
-            "push_enabled": True,
-            "notification_types": {
-                "progress_updates": True,
-                "badges_earned": True,
-                "milestones": True,
-                "reminders": True,
-                "weekly_summary": True
-            },
-            "quiet_hours": {
-                "enabled": True,
-                "start": 22,
-                "end": 8
-            }
-        }
+        return _DEFAULT_PREFERENCES
+    
+    async def _get_template(self, event_type: str) -> Tuple[str, str]:
+        """Get the (title, message) template for an event type."""
+        # In production, would fetch from the content service
+        return _TEMPLATES.get(event_type, _DEFAULT_TEMPLATE)
     
     def _should_send_notification(self, event_type: str, preferences: Dict[str, Any]) -> bool:
         """Check if notification should be sent based on preferences."""
         # Check if notification type is enabled
-        notification_category = self._get_notification_category(event_type)
-        if not preferences["notification_types"].get(notification_category, True):
+        if not preferences["notification_types"].get(_CATEGORY_MAP.get(event_type, _DEFAULT_CATEGORY), True):
             return False
         
-        # Check quiet hours
-        if preferences["quiet_hours"]["enabled"]:
-            current_hour = datetime.utcnow().hour
-            start = preferences["quiet_hours"]["start"]
-            end = preferences["quiet_hours"]["end"]
-            
-            if start > end:  # Crosses midnight
-                if current_hour >= start or current_hour < end:
-                    return False
-            else:
-                if start <= current_hour < end:
-                    return False
+        # Check quiet hours; modular arithmetic handles windows that cross midnight
+        quiet_hours = preferences["quiet_hours"]
+        if quiet_hours["enabled"]:
+            start = quiet_hours["start"]
+            span = (quiet_hours["end"] - start) % 24
+            if ((self.now or datetime.utcnow()).hour - start) % 24 < span:
+                return False
         
         return True
     
     def _get_notification_category(self, event_type: str) -> str:
         """Map event type to notification category."""
-        category_map = {
-            "concept_completed": "progress_updates",
-            "concept_mastered": "progress_updates",
-            "badge_earned": "badges_earned",
-            "level_up": "milestones",
-            "streak_milestone": "milestones",
-            "daily_reminder": "reminders",
-            "weekly_summary": "weekly_summary"
-        }
-        
-        return category_map.get(event_type, "progress_updates")
+        return _CATEGORY_MAP.get(event_type, _DEFAULT_CATEGORY)
     
-    def _generate_notification(self, event_type: str, event_data: Dict[str, Any]) -> Dict[str, str]:
+    def _generate_notification(
+        self,
+        event_type: str,
+        event_data: Dict[str, Any],
+        template: Optional[Tuple[str, str]] = None
+    ) -> Dict[str, str]:
         """Generate notification content based on event."""
-        templates = {
-            "concept_completed": {
-                "title": "Concept Completed!",
-                "message": "Great job! You've completed '{concept_name}'."
-            },
-            "concept_mastered": {
-                "title": "Concept Mastered!",
-                "message": "Excellent! You've mastered '{concept_name}' with a score of {score}%!"
-            },
-            "badge_earned": {
-                "title": "New Badge Earned!",
-                "message": "Congratulations! You've earned the '{badge_name}' badge!"
-            },
-            "level_up": {
-                "title": "Level Up!",
-                "message": "Amazing! You've reached level {level}!"
-            }
-        }
-        
-        template = templates.get(event_type, {
-            "title": "Progress Update",
-            "message": "You've made progress in your learning journey!"
-        })
+        title, message = template or _TEMPLATES.get(event_type, _DEFAULT_TEMPLATE)
         
-        # Format message with event data
-        title = template["title"]
-        message = template["message"]
-        
-        for key, value in event_data.items():
-            message = message.replace(f"{{{key}}}", str(value))
+        # Format message with event data, leaving unknown placeholders intact
+        if _TEMPLATE_FIELDS.get(event_type):
+            message = message.format_map(_SafeDict(event_data))
         
         return {"title": title, "message": message}
     
     def _generate_weekly_summary_message(self, summary: Dict[str, Any]) -> str:
         """Generate weekly summary message."""
-        message_parts = [
-            f"This week you:",
-            f"• Started {summary['concepts_started']} concepts",
-            f"• Mastered {summary['concepts_mastered']} concepts",
-            f"• Earned {summary['points_earned']} points"
-        ]
-        
-        if summary['badges_earned'] > 0:
-            message_parts.append(f"• Earned {summary['badges_earned']} badges: {', '.join(summary['badge_names'])}")
-        
-        message_parts.append("\nKeep up the great work!")
+        badges = (
+            f"\n• Earned {summary['badges_earned']} badges: {', '.join(summary['badge_names'])}"
+            if summary['badges_earned'] > 0 else ""
+        )
         
-        return "\n".join(message_parts)
+        return (
+            f"This week you:\n"
+            f"• Started {summary['concepts_started']} concepts\n"
+            f"• Mastered {summary['concepts_mastered']} concepts\n"
+            f"• Earned {summary['points_earned']} points"
+            f"{badges}\n\nKeep up the great work!"
+        )
     
     async def _send_notification(
         self,
@@ -353,20 +465,24 @@ class NotificationEngine:
         message: str,
         data: Optional[Dict[str, Any]] = None
     ) -> bool:
-        """Send notification via messaging service."""
+        """Send notification via messaging service, or buffer it for a batched publish."""
+        payload = {
+            "student_id": student_id,
+            "type": notification_type,
+            "title": title,
+            "message": message,
+            "data": data or {},
+            "timestamp": self.now or datetime.utcnow()
+        }
+        
+        if self.notification_buffer is not None:
+            self.notification_buffer.append(payload)
+            return True
+        
         try:
-            payload = {
-                "student_id": student_id,
-                "type": notification_type,
-                "title": title,
-                "message": message,
-                "data": data or {},
-                "timestamp": datetime.utcnow().isoformat()
-            }
-            
             await send_message(
-                topic="progress-notifications",
-                message=json.dumps(payload),
+                topic=NOTIFICATION_TOPIC,
+                message=orjson.dumps(payload, option=_ORJSON_OPTIONS).decode(),
                 attributes={
                     "student_id": student_id,
                     "notification_type": notification_type
@@ -390,90 +506,88 @@ class NotificationEngine:
             )
             return False
     
-    async def _should_send_daily_reminder(self, student_id: str) -> bool:
-        """Check if daily reminder should be sent."""
-        # Check if already active today
-        result = await self.db.execute(
-            select(ConceptProgress).where(
+    async def flush_notifications(self, notifications: List[Dict[str, Any]]) -> int:
+        """Publish buffered notifications as newline-delimited JSON batches."""
+        return await publish_notifications(notifications, self.session_factory)
+    
+    async def _stream_reminder_states(self, today: date) -> AsyncIterator[List[tuple]]:
+        """Stream the reminder inputs for every student from a single query, in chunks."""
+        week_start = today - timedelta(days=today.weekday())
+        
+        students = select(Progress.student_id).distinct().subquery("students")
+        
+        active_today = (
+            select(ConceptProgress.student_id)
+            .where(ConceptProgress.last_attempted_at >= today)
+            .distinct()
+            .subquery("active_today")
+        )
+        
+        mastered_this_week = (
+            select(
+                ConceptProgress.student_id,
+                func.count(ConceptProgress.id).label("mastered")
+            )
+            .where(
                 and_(
-                    ConceptProgress.student_id == student_id,
-                    ConceptProgress.last_attempted_at >= date.today()
+                    ConceptProgress.status == ProgressStatus.MASTERED.value,
+                    ConceptProgress.mastered_at >= week_start
                 )
-            ).limit(1)
+            )
+            .group_by(ConceptProgress.student_id)
+            .subquery("mastered_this_week")
         )
         
-        return result.scalar_one_or_none() is None
-    
-    async def _should_send_streak_warning(self, student_id: str) -> bool:
-        """Check if streak warning should be sent."""
-        result = await self.db.execute(
-            select(Streak).where(Streak.student_id == student_id)
+        result = await self.db.stream(
+            select(
+                students.c.student_id,
+                active_today.c.student_id.isnot(None).label("active_today"),
+                Streak.current_streak,
+                Streak.last_activity_date,
+                func.coalesce(mastered_this_week.c.mastered, 0).label("mastered_this_week")
+            )
+            .select_from(students)
+            .outerjoin(active_today, active_today.c.student_id == students.c.student_id)
+            .outerjoin(Streak, Streak.student_id == students.c.student_id)
+            .outerjoin(mastered_this_week, mastered_this_week.c.student_id == students.c.student_id)
+            .execution_options(yield_per=REMINDER_STREAM_CHUNK_SIZE)
         )
-        streak = result.scalar_one_or_none()
         
-        if not streak or streak.current_streak < 3:
+        async for rows in result.partitions():
+            yield [(str(row.student_id), ReminderState(*row[1:])) for row in rows]
+    
+    def _should_send_daily_reminder(self, state: ReminderState) -> bool:
+        """Check if daily reminder should be sent."""
+        return not state.active_today
+    
+    def _should_send_streak_warning(self, state: ReminderState, today: Optional[date] = None) -> bool:
+        """Check if streak warning should be sent."""
+        if not state.current_streak or state.current_streak < 3:
             return False
         
         # Check if last activity was yesterday (at risk of breaking streak)
-        return streak.last_activity_date == date.today() - timedelta(days=1)
+        return state.last_activity_date == (today or date.today()) - timedelta(days=1)
     
-    async def _send_streak_warning(self, student_id: str) -> bool:
-        """Send streak warning notification."""
-        result = await self.db.execute(
-            select(Streak).where(Streak.student_id == student_id)
-        )
-        streak = result.scalar_one_or_none()
-        
-        if not streak:
-            return False
-        
+    async def _send_streak_warning(self, student_id: str, current_streak: int) -> bool:
+        """Send streak warning notification for the streak loaded by the reminder check."""
         await self._send_notification(
             student_id=student_id,
             notification_type="streak_warning",
             title="Streak at Risk!",
-            message=f"Your {streak.current_streak}-day streak is at risk! Complete a concept today to keep it alive.",
-            data={"current_streak": streak.current_streak}
+            message=f"Your {current_streak}-day streak is at risk! Complete a concept today to keep it alive.",
+            data={"current_streak": current_streak}
         )
         
         return True
     
-    async def _should_send_goal_reminder(self, student_id: str) -> bool:
+    def _should_send_goal_reminder(self, state: ReminderState) -> bool:
         """Check if goal reminder should be sent."""
-        # Check if close to weekly goal
-        week_start = date.today() - timedelta(days=date.today().weekday())
-        
-        result = await self.db.execute(
-            select(func.count(ConceptProgress.id)).where(
-                and_(
-                    ConceptProgress.student_id == student_id,
-                    ConceptProgress.status == ProgressStatus.MASTERED.value,
-                    ConceptProgress.mastered_at >= week_start
-                )
-            )
-        )
-        
-        mastered_this_week = result.scalar() or 0
-        weekly_goal = 5  # Default goal
-        
         # Send reminder if close to goal (80% or more) but not reached
-        return weekly_goal * 0.8 <= mastered_this_week < weekly_goal
+        return WEEKLY_GOAL * 0.8 <= state.mastered_this_week < WEEKLY_GOAL
     
-    async def _send_goal_reminder(self, student_id: str) -> bool:
-        """Send goal reminder notification."""
-        week_start = date.today() - timedelta(days=date.today().weekday())
-        
-        result = await self.db.execute(
-            select(func.count(ConceptProgress.id)).where(
-                and_(
-                    ConceptProgress.student_id == student_id,
-                    ConceptProgress.status == ProgressStatus.MASTERED.value,
-                    ConceptProgress.mastered_at >= week_start
-                )
-            )
-        )
-        
-        mastered_this_week = result.scalar() or 0
-        weekly_goal = 5  # Default goal
+    async def _send_goal_reminder(self, student_id: str, mastered_this_week: int) -> bool:
+        """Send goal reminder notification for the count loaded by the reminder check."""
+        weekly_goal = WEEKLY_GOAL
         remaining = weekly_goal - mastered_this_week
         
         await self._send_notification(
@@ -488,4 +602,62 @@ class NotificationEngine:
             }
         )
         
-        return True
\ No newline at end of file
+        return True
+
+
+async def publish_notifications(
+    notifications: List[Dict[str, Any]],
+    session_factory: async_sessionmaker = AsyncSessionLocal
+) -> int:
+    """Publish notifications as newline-delimited JSON batches and log each published batch.
+    
+    Needs no caller session, so it can run after the request that built the payloads.
+    """
+    published = 0
+    batch_size = settings.NOTIFICATION_BATCH_SIZE
+    
+    for start in range(0, len(notifications), batch_size):
+        batch = notifications[start:start + batch_size]
+        try:
+            await send_message(
+                topic=NOTIFICATION_TOPIC,
+                message=b"\n".join(
+                    orjson.dumps(payload, option=_ORJSON_OPTIONS) for payload in batch
+                ).decode(),
+                attributes={
+                    "content_type": "application/x-ndjson",
+                    "batch_size": str(len(batch))
+                }
+            )
+            published += len(batch)
+        except Exception as e:
+            logger.error("Failed to publish notification batch", size=len(batch), error=str(e))
+            continue
+        
+        await _log_notifications(batch, session_factory)
+    
+    logger.info("Notifications published", published=published, buffered=len(notifications))
+    return published
+
+
+async def _log_notifications(payloads: List[Dict[str, Any]], session_factory: async_sessionmaker) -> None:
+    """Record published notifications in the audit log with one multi-row insert."""
+    rows = [
+        {
+            "student_id": payload["student_id"],
+            "notification_type": payload["type"],
+            "title": payload["title"],
+            "message": payload["message"],
+            "data": payload["data"],
+            "sent_at": payload["timestamp"]
+        }
+        for payload in payloads
+    ]
+    
+    # Own session: the caller's session may be busy streaming reminder states
+    try:
+        async with session_factory() as session:
+            await session.execute(insert(NotificationLog), rows)
+            await session.commit()
+    except Exception as e:
+        logger.warning("Failed to log notifications", size=len(rows), error=str(e))
\ No newline at end of file
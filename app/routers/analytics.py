@@ -2,15 +2,21 @@
 
 from typing import List, Optional, Dict, Any
 from datetime import datetime, date, timedelta
-from fastapi import APIRouter, Depends, HTTPException, Query
+import asyncio
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, func
+from sqlalchemy import select, insert, and_, func, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 import structlog
 
-from app.core.database import get_db
+from app.core.cache import get_cached, set_cached, student_cache_key, invalidate_student
+from app.core.config import settings
+from app.core.database import get_db, execute_in_new_session
+from app.core.dependencies import require_roles, require_self_or_role
 from app.core.auth import get_current_user
 from app.models.analytics import Analytics, LearningMetrics, ProgressSnapshot
 from app.models.progress import Progress, ConceptProgress, ProgressStatus
+from app.models.gamification import Streak
 from app.schemas.analytics import (
     AnalyticsResponse, LearningMetricsResponse, ProgressSnapshotResponse,
     AnalyticsCreate, MetricsQuery, InsightsResponse
@@ -20,6 +26,23 @@ logger = structlog.get_logger()
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
 
+# Queries that run in parallel each get their own session from the pool
+
+async def _fetch_scalar(stmt) -> Any:
+    """Run a single-value query on its own session."""
+    return (await execute_in_new_session(stmt)).scalar()
+
+
+async def _fetch_one(stmt) -> Any:
+    """Run a single-row query on its own session."""
+    return (await execute_in_new_session(stmt)).one()
+
+
+async def _fetch_all(stmt) -> List[Any]:
+    """Run a multi-row query on its own session."""
+    return (await execute_in_new_session(stmt)).all()
+
+
 @router.get("/{student_id}", response_model=List[AnalyticsResponse])
 async def get_student_analytics(
     student_id: str,
@@ -31,8 +54,7 @@ async def get_student_analytics(
 ):
     """Get analytics for a student."""
     # Verify authorization
-    if current_user["sub"] != student_id and "instructor" not in current_user.get("roles", []):
-        raise HTTPException(status_code=403, detail="Not authorized")
+    require_self_or_role(current_user, student_id, "instructor")
     
     # Build query
     query = select(Analytics).where(
@@ -60,14 +82,17 @@ async def get_student_analytics(
 @router.post("/aggregate", response_model=Dict[str, Any])
 async def aggregate_analytics(
     period: str = Query(..., regex="^(daily|weekly|monthly)$"),
-    target_date: date = Query(date.today()),
+    target_date: Optional[date] = Query(None),
+    from_raw: bool = Query(False, description="Recompute weekly/monthly from concept progress instead of daily rollups"),
     current_user: dict = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Aggregate analytics for all students (admin only)."""
     # Only system or admin can aggregate
-    if "admin" not in current_user.get("roles", []) and "system" not in current_user.get("roles", []):
-        raise HTTPException(status_code=403, detail="Not authorized")
+    require_roles(current_user, "admin", "system")
+    
+    # Default to today, evaluated per request
+    target_date = target_date or date.today()
     
     # Calculate date range based on period
     if period == "daily":
@@ -81,83 +106,87 @@ async def aggregate_analytics(
         next_month = start_date.replace(day=28) + timedelta(days=4)
         end_date = next_month - timedelta(days=next_month.day)
     
-    # Get all students with activity in period
-    students_query = select(Progress.student_id).distinct()
-    students_result = await db.execute(students_query)
-    student_ids = [row[0] for row in students_result]
-    
-    aggregated_count = 0
-    
-    for student_id in student_ids:
-        # Get concept progress stats for period
-        concept_stats = await db.execute(
-            select(
-                func.count(ConceptProgress.id).filter(
-                    ConceptProgress.created_at.between(start_date, end_date + timedelta(days=1))
-                ).label("started"),
-                func.count(ConceptProgress.id).filter(
-                    and_(
-                        ConceptProgress.status == ProgressStatus.COMPLETED.value,
-                        ConceptProgress.completed_at.between(start_date, end_date + timedelta(days=1))
-                    )
-                ).label("completed"),
-                func.count(ConceptProgress.id).filter(
-                    and_(
-                        ConceptProgress.status == ProgressStatus.MASTERED.value,
-                        ConceptProgress.mastered_at.between(start_date, end_date + timedelta(days=1))
-                    )
-                ).label("mastered"),
-                func.avg(ConceptProgress.current_score).label("avg_score")
-            ).where(ConceptProgress.student_id == student_id)
-        )
-        
-        stats = concept_stats.one()
+    # Weekly and monthly buckets are sums of the daily rows already aggregated
+    if period != "daily" and not from_raw:
+        aggregated_count = await _rollup_daily_analytics(db, period, start_date, end_date)
+        await db.commit()
         
-        # Calculate time spent (simplified - would need session tracking)
-        time_spent = await db.execute(
-            select(func.sum(ConceptProgress.attempts * 300)).where(  # Assume 5 min per attempt
+        return {
+            "period": period,
+            "target_date": str(target_date),
+            "students_processed": aggregated_count
+        }
+    
+    period_end = end_date + timedelta(days=1)
+    
+    def in_period(column):
+        return column.between(start_date, period_end)
+    
+    # Aggregate every student's period stats in one grouped query; students
+    # without concept progress still get a zeroed row
+    students = select(Progress.student_id).distinct().subquery("students")
+    grouped_result = await db.execute(
+        select(
+            students.c.student_id,
+            func.count(ConceptProgress.id).filter(
+                in_period(ConceptProgress.created_at)
+            ).label("started"),
+            func.count(ConceptProgress.id).filter(
                 and_(
-                    ConceptProgress.student_id == student_id,
-                    ConceptProgress.last_attempted_at.between(start_date, end_date + timedelta(days=1))
+                    ConceptProgress.status == ProgressStatus.COMPLETED.value,
+                    in_period(ConceptProgress.completed_at)
                 )
-            )
-        )
-        total_time = time_spent.scalar() or 0
-        
-        # Create or update analytics record
-        existing = await db.execute(
-            select(Analytics).where(
+            ).label("completed"),
+            func.count(ConceptProgress.id).filter(
                 and_(
-                    Analytics.student_id == student_id,
-                    Analytics.period == period,
-                    Analytics.period_date == target_date
+                    ConceptProgress.status == ProgressStatus.MASTERED.value,
+                    in_period(ConceptProgress.mastered_at)
                 )
-            )
+            ).label("mastered"),
+            func.avg(ConceptProgress.current_score).label("avg_score"),
+            # Time spent from the tracked per-concept totals
+            func.sum(ConceptProgress.time_spent).filter(
+                in_period(ConceptProgress.last_attempted_at)
+            ).label("time_spent")
         )
-        analytics = existing.scalar_one_or_none()
-        
-        if analytics:
-            # Update existing
-            analytics.concepts_started = stats.started
-            analytics.concepts_completed = stats.completed
-            analytics.concepts_mastered = stats.mastered
-            analytics.average_score = stats.avg_score or 0.0
-            analytics.time_spent = total_time
-        else:
-            # Create new
-            analytics = Analytics(
-                student_id=student_id,
-                period=period,
-                period_date=target_date,
-                concepts_started=stats.started,
-                concepts_completed=stats.completed,
-                concepts_mastered=stats.mastered,
-                average_score=stats.avg_score or 0.0,
-                time_spent=total_time
-            )
-            db.add(analytics)
-        
-        aggregated_count += 1
+        .select_from(students)
+        .outerjoin(ConceptProgress, ConceptProgress.student_id == students.c.student_id)
+        .group_by(students.c.student_id)
+    )
+    grouped = grouped_result.all()
+    
+    # Upsert every student's row in one statement; executemany batches the rows
+    # so large student counts stay under the bind-parameter limit
+    rows = [
+        {
+            "student_id": str(stats.student_id),
+            "period": period,
+            # Rows are keyed by the period's first day, matching the backfill
+            "period_date": start_date,
+            "concepts_started": stats.started,
+            "concepts_completed": stats.completed,
+            "concepts_mastered": stats.mastered,
+            "average_score": stats.avg_score or 0.0,
+            "time_spent": stats.time_spent or 0
+        }
+        for stats in grouped
+    ]
+    
+    if rows:
+        stmt = pg_insert(Analytics)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["student_id", "period", "period_date"],
+            set_={
+                key: stmt.excluded[key]
+                for key in (
+                    "concepts_started", "concepts_completed", "concepts_mastered",
+                    "average_score", "time_spent"
+                )
+            }
+        )
+        await db.execute(stmt, rows)
+    
+    aggregated_count = len(grouped)
     
     await db.commit()
     
@@ -168,6 +197,50 @@ async def aggregate_analytics(
     }
 
 
+async def _rollup_daily_analytics(
+    db: AsyncSession,
+    period: str,
+    start_date: date,
+    end_date: date
+) -> int:
+    """Roll the daily analytics rows in a date range up into one period row per student, dated start_date."""
+    daily = Analytics.__table__.c
+    rollup = (
+        select(
+            # INSERT ... SELECT skips Python-side defaults, so generate the id here
+            func.gen_random_uuid(),
+            daily.student_id,
+            literal(period),
+            literal(start_date),
+            func.sum(daily.concepts_started),
+            func.sum(daily.concepts_completed),
+            func.sum(daily.concepts_mastered),
+            func.avg(daily.average_score),
+            func.sum(daily.time_spent)
+        )
+        .where(
+            and_(
+                daily.period == "daily",
+                daily.period_date.between(start_date, end_date)
+            )
+        )
+        .group_by(daily.student_id)
+    )
+    
+    columns = [
+        "id", "student_id", "period", "period_date", "concepts_started",
+        "concepts_completed", "concepts_mastered", "average_score", "time_spent"
+    ]
+    stmt = pg_insert(Analytics).from_select(columns, rollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["student_id", "period", "period_date"],
+        set_={key: stmt.excluded[key] for key in columns[4:]}
+    ).returning(Analytics.student_id)
+    
+    result = await db.execute(stmt)
+    return len(result.all())
+
+
 @router.get("/{student_id}/metrics", response_model=List[LearningMetricsResponse])
 async def get_learning_metrics(
     student_id: str,
@@ -179,8 +252,7 @@ async def get_learning_metrics(
 ):
     """Get detailed learning metrics."""
     # Verify authorization
-    if current_user["sub"] != student_id and "instructor" not in current_user.get("roles", []):
-        raise HTTPException(status_code=403, detail="Not authorized")
+    require_self_or_role(current_user, student_id, "instructor")
     
     query = select(LearningMetrics).where(LearningMetrics.student_id == student_id)
     
@@ -203,76 +275,67 @@ async def calculate_metrics(
 ):
     """Calculate current learning metrics for a student."""
     # Verify authorization
-    if current_user["sub"] != student_id and "instructor" not in current_user.get("roles", []):
-        raise HTTPException(status_code=403, detail="Not authorized")
+    require_self_or_role(current_user, student_id, "instructor")
     
-    metrics_calculated = []
-    
-    # Calculate learning velocity (concepts per day)
-    velocity_result = await db.execute(
+    # Fetch the inputs for all three metrics in one pass and do the arithmetic here
+    finished = ConceptProgress.status.in_([ProgressStatus.COMPLETED.value, ProgressStatus.MASTERED.value])
+    inputs_result = await db.execute(
         select(
-            func.count(ConceptProgress.id) / func.greatest(
-                func.extract('day', func.max(ConceptProgress.created_at) - func.min(ConceptProgress.created_at)),
-                1
-            )
-        ).where(
-            and_(
-                ConceptProgress.student_id == student_id,
-                ConceptProgress.status.in_([ProgressStatus.COMPLETED.value, ProgressStatus.MASTERED.value])
-            )
-        )
-    )
-    velocity = velocity_result.scalar() or 0.0
-    
-    velocity_metric = LearningMetrics(
-        student_id=student_id,
-        metric_type="velocity",
-        metric_value=float(velocity),
-        metadata={"unit": "concepts_per_day"}
-    )
-    db.add(velocity_metric)
-    metrics_calculated.append("velocity")
-    
-    # Calculate accuracy (average score)
-    accuracy_result = await db.execute(
-        select(func.avg(ConceptProgress.current_score)).where(
-            and_(
-                ConceptProgress.student_id == student_id,
+            func.count(ConceptProgress.id).filter(finished).label("finished"),
+            func.min(ConceptProgress.created_at).filter(finished).label("first_finished_created"),
+            func.max(ConceptProgress.created_at).filter(finished).label("last_finished_created"),
+            func.avg(ConceptProgress.current_score).filter(
                 ConceptProgress.current_score.isnot(None)
-            )
-        )
-    )
-    accuracy = accuracy_result.scalar() or 0.0
-    
-    accuracy_metric = LearningMetrics(
-        student_id=student_id,
-        metric_type="accuracy",
-        metric_value=float(accuracy),
-        metadata={"unit": "percentage"}
-    )
-    db.add(accuracy_metric)
-    metrics_calculated.append("accuracy")
-    
-    # Calculate consistency (active days / total days)
-    consistency_result = await db.execute(
-        select(
-            func.count(func.distinct(func.date(ConceptProgress.last_attempted_at))),
-            func.extract('day', func.max(ConceptProgress.last_attempted_at) - func.min(ConceptProgress.created_at))
+            ).label("accuracy"),
+            func.count(func.distinct(func.date(ConceptProgress.last_attempted_at))).label("active_days"),
+            func.min(ConceptProgress.created_at).label("first_created"),
+            func.max(ConceptProgress.last_attempted_at).label("last_attempted")
         ).where(ConceptProgress.student_id == student_id)
     )
-    active_days, total_days = consistency_result.one()
+    inputs = inputs_result.one()
+    
+    # Learning velocity (concepts per day)
+    velocity = 0.0
+    if inputs.finished:
+        finished_span = (inputs.last_finished_created - inputs.first_finished_created).days
+        velocity = inputs.finished / max(finished_span, 1)
+    
+    # Accuracy (average score)
+    accuracy = inputs.accuracy or 0.0
+    
+    # Consistency (active days / total days)
+    active_days = inputs.active_days
+    total_days = None
+    if inputs.last_attempted and inputs.first_created:
+        total_days = (inputs.last_attempted - inputs.first_created).days
     consistency = (active_days / max(total_days or 1, 1)) * 100
     
-    consistency_metric = LearningMetrics(
-        student_id=student_id,
-        metric_type="consistency",
-        metric_value=float(consistency),
-        metadata={"active_days": active_days, "total_days": total_days}
-    )
-    db.add(consistency_metric)
-    metrics_calculated.append("consistency")
+    # Record all three metrics with one multi-row insert
+    metric_rows = [
+        {
+            "student_id": student_id,
+            "metric_type": "velocity",
+            "metric_value": float(velocity),
+            "metadata_": {"unit": "concepts_per_day"}
+        },
+        {
+            "student_id": student_id,
+            "metric_type": "accuracy",
+            "metric_value": float(accuracy),
+            "metadata_": {"unit": "percentage"}
+        },
+        {
+            "student_id": student_id,
+            "metric_type": "consistency",
+            "metric_value": float(consistency),
+            "metadata_": {"active_days": active_days, "total_days": total_days}
+        }
+    ]
+    await db.execute(insert(LearningMetrics), metric_rows)
+    metrics_calculated = [row["metric_type"] for row in metric_rows]
     
     await db.commit()
+    await invalidate_student("analytics", student_id)
     
     return {
         "metrics_calculated": metrics_calculated,
@@ -292,81 +355,103 @@ async def get_learning_insights(
 ):
     """Get AI-generated learning insights."""
     # Verify authorization
-    if current_user["sub"] != student_id and "instructor" not in current_user.get("roles", []):
-        raise HTTPException(status_code=403, detail="Not authorized")
-    
-    # Get recent metrics
-    metrics_result = await db.execute(
-        select(LearningMetrics).where(
-            LearningMetrics.student_id == student_id
-        ).order_by(LearningMetrics.calculated_at.desc()).limit(10)
+    require_self_or_role(current_user, student_id, "instructor")
+    
+    cache_key = await student_cache_key("analytics", student_id, "router_insights", date.today())
+    cached = await get_cached(cache_key)
+    if cached is not None:
+        return cached
+    
+    # Struggling concepts among the 20 most recently attempted, counted in SQL
+    recent_progress = (
+        select(ConceptProgress.attempts, ConceptProgress.current_score)
+        .where(ConceptProgress.student_id == student_id)
+        .order_by(ConceptProgress.last_attempted_at.desc())
+        .limit(20)
+        .subquery("recent_progress")
     )
-    metrics = metrics_result.scalars().all()
     
-    # Get recent progress
-    progress_result = await db.execute(
-        select(ConceptProgress).where(
-            ConceptProgress.student_id == student_id
-        ).order_by(ConceptProgress.last_attempted_at.desc()).limit(20)
+    # Get the latest value of each metric type, the struggling count and the
+    # current streak concurrently
+    latest_metrics, struggling_count, current_streak = await asyncio.gather(
+        _fetch_all(
+            select(LearningMetrics.metric_type, LearningMetrics.metric_value)
+            .where(LearningMetrics.student_id == student_id)
+            .order_by(LearningMetrics.metric_type, LearningMetrics.calculated_at.desc())
+            .distinct(LearningMetrics.metric_type)
+        ),
+        _fetch_scalar(
+            select(func.count()).select_from(recent_progress).where(
+                and_(
+                    recent_progress.c.attempts > 3,
+                    recent_progress.c.current_score < 70
+                )
+            )
+        ),
+        _fetch_scalar(
+            select(Streak.current_streak).where(Streak.student_id == student_id)
+        )
     )
-    recent_progress = progress_result.scalars().all()
+    current_streak = current_streak or 0
+    latest = dict(latest_metrics)
+    velocity = latest.get("velocity")
+    accuracy = latest.get("accuracy")
     
     # Generate insights (simplified - would use AI in production)
     insights = []
     recommendations = []
     
     # Analyze velocity
-    velocity_metrics = [m for m in metrics if m.metric_type == "velocity"]
-    if velocity_metrics and velocity_metrics[0].metric_value < 1.0:
+    if velocity is not None and velocity < 1.0:
         insights.append("Your learning pace has slowed down. Try to complete at least one concept per day.")
         recommendations.append("Set a daily learning goal to maintain momentum.")
     
     # Analyze accuracy
-    accuracy_metrics = [m for m in metrics if m.metric_type == "accuracy"]
-    if accuracy_metrics and accuracy_metrics[0].metric_value < 70:
+    if accuracy is not None and accuracy < 70:
         insights.append("Your accuracy is below 70%. Consider reviewing concepts before moving forward.")
         recommendations.append("Focus on mastering current concepts before starting new ones.")
     
     # Analyze streaks
-    streak_result = await db.execute(
-        select(Streak).where(Streak.student_id == student_id)
-    )
-    streak = streak_result.scalar_one_or_none()
-    
-    if streak and streak.current_streak > 7:
-        insights.append(f"Great job! You're on a {streak.current_streak}-day learning streak!")
-    elif not streak or streak.current_streak == 0:
+    if current_streak > 7:
+        insights.append(f"Great job! You're on a {current_streak}-day learning streak!")
+    elif current_streak == 0:
         recommendations.append("Start a learning streak by studying every day.")
     
     # Identify struggling areas
-    struggling_concepts = [
-        p for p in recent_progress 
-        if p.attempts > 3 and p.current_score < 70
-    ]
-    if struggling_concepts:
-        insights.append(f"You're struggling with {len(struggling_concepts)} concepts. Consider getting help.")
+    if struggling_count:
+        insights.append(f"You're struggling with {struggling_count} concepts. Consider getting help.")
         recommendations.append("Reach out to an instructor for help with difficult concepts.")
     
-    return {
+    response = {
         "insights": insights,
         "recommendations": recommendations,
-        "strengths": ["Consistency", "Problem-solving"] if streak and streak.current_streak > 3 else [],
-        "areas_for_improvement": ["Speed", "Accuracy"] if accuracy_metrics and accuracy_metrics[0].metric_value < 80 else [],
+        "strengths": ["Consistency", "Problem-solving"] if current_streak > 3 else [],
+        "areas_for_improvement": ["Speed", "Accuracy"] if accuracy is not None and accuracy < 80 else [],
         "generated_at": datetime.utcnow()
     }
+    
+    await set_cached(cache_key, response, settings.INSIGHTS_CACHE_TTL)
+    return response
 
 
 @router.get("/{student_id}/snapshot", response_model=ProgressSnapshotResponse)
 async def get_progress_snapshot(
     student_id: str,
-    snapshot_date: date = Query(date.today()),
+    snapshot_date: Optional[date] = Query(None),
     current_user: dict = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Get or create progress snapshot."""
     # Verify authorization
-    if current_user["sub"] != student_id and "instructor" not in current_user.get("roles", []):
-        raise HTTPException(status_code=403, detail="Not authorized")
+    require_self_or_role(current_user, student_id, "instructor")
+    
+    # Default to today, evaluated per request
+    snapshot_date = snapshot_date or date.today()
+    
+    cache_key = await student_cache_key("analytics", student_id, "router_snapshot", snapshot_date)
+    cached = await get_cached(cache_key)
+    if cached is not None:
+        return cached
     
     # Check for existing snapshot
     result = await db.execute(
@@ -381,62 +466,60 @@ async def get_progress_snapshot(
     
     if not snapshot:
         # Create new snapshot
-        # Get concept counts
-        total_result = await db.execute(
-            select(func.count(ConceptProgress.id)).where(
-                ConceptProgress.student_id == student_id
-            )
-        )
-        total_concepts = total_result.scalar() or 0
-        
-        mastered_result = await db.execute(
-            select(func.count(ConceptProgress.id)).where(
-                and_(
-                    ConceptProgress.student_id == student_id,
-                    ConceptProgress.status == ProgressStatus.MASTERED.value
-                )
-            )
-        )
-        mastered_concepts = mastered_result.scalar() or 0
-        
-        in_progress_result = await db.execute(
-            select(func.count(ConceptProgress.id)).where(
-                and_(
-                    ConceptProgress.student_id == student_id,
-                    ConceptProgress.status == ProgressStatus.IN_PROGRESS.value
+        # Get concept counts and average mastery time in one scan, concurrently
+        # with the per-subject average scores
+        counts, subject_scores = await asyncio.gather(
+            _fetch_one(
+                select(
+                    func.count(ConceptProgress.id).label("total"),
+                    func.count(ConceptProgress.id).filter(
+                        ConceptProgress.status == ProgressStatus.MASTERED.value
+                    ).label("mastered"),
+                    func.count(ConceptProgress.id).filter(
+                        ConceptProgress.status == ProgressStatus.IN_PROGRESS.value
+                    ).label("in_progress"),
+                    func.avg(
+                        func.extract('day', ConceptProgress.mastered_at - ConceptProgress.created_at)
+                    ).filter(ConceptProgress.mastered_at.isnot(None)).label("avg_mastery_time")
+                ).where(ConceptProgress.student_id == student_id)
+            ),
+            _fetch_all(
+                select(ConceptProgress.subject)
+                .where(
+                    and_(
+                        ConceptProgress.student_id == student_id,
+                        ConceptProgress.subject.isnot(None),
+                        ConceptProgress.current_score.isnot(None)
+                    )
                 )
+                .group_by(ConceptProgress.subject)
+                .order_by(func.avg(ConceptProgress.current_score).desc())
             )
         )
-        in_progress_concepts = in_progress_result.scalar() or 0
         
-        # Calculate average mastery time
-        mastery_time_result = await db.execute(
-            select(
-                func.avg(
-                    func.extract('day', ConceptProgress.mastered_at - ConceptProgress.created_at)
-                )
-            ).where(
-                and_(
-                    ConceptProgress.student_id == student_id,
-                    ConceptProgress.mastered_at.isnot(None)
-                )
-            )
-        )
-        avg_mastery_time = mastery_time_result.scalar() or 0.0
+        # Subjects ordered from highest to lowest average score
+        subjects = [row.subject for row in subject_scores]
+        strongest_subjects = subjects[:2]
+        weakest_subjects = subjects[-1:] if len(subjects) > 2 else []
         
         snapshot = ProgressSnapshot(
             student_id=student_id,
             snapshot_date=snapshot_date,
-            total_concepts=total_concepts,
-            mastered_concepts=mastered_concepts,
-            in_progress_concepts=in_progress_concepts,
-            average_mastery_time=float(avg_mastery_time),
-            strongest_subjects=["Mathematics", "Science"],  # Would calculate from data
-            weakest_subjects=["History"],  # Would calculate from data
+            total_concepts=counts.total,
+            mastered_concepts=counts.mastered,
+            in_progress_concepts=counts.in_progress,
+            average_mastery_time=float(counts.avg_mastery_time or 0.0),
+            strongest_subjects=strongest_subjects,
+            weakest_subjects=weakest_subjects,
             recommendations=["Focus on consistent daily practice", "Review weak areas"]
         )
         db.add(snapshot)
         await db.commit()
         await db.refresh(snapshot)
     
-    return snapshot
\ No newline at end of file
+    response = {
+        column.key: getattr(snapshot, column.key)
+        for column in ProgressSnapshot.__table__.columns
+    }
+    await set_cached(cache_key, response, settings.CACHE_TTL)
+    return response
\ No newline at end of file
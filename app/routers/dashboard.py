@@ -5,9 +5,13 @@ from datetime import datetime, date, timedelta
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, func, case
+from sqlalchemy.orm import joinedload
 import structlog
 
-from app.core.database import get_db
+from app.core.cache import get_cached, set_cached, make_cache_key, student_cache_key
+from app.core.config import settings
+from app.core.database import get_db, execute_concurrently
+from app.core.dependencies import require_roles, require_self_or_role
 from app.core.auth import get_current_user
 from app.models.progress import Progress, ConceptProgress, ProgressStatus
 from app.models.gamification import Points, Badge, UserBadge, Streak
@@ -29,74 +33,67 @@ async def get_student_dashboard(
 ):
     """Get comprehensive dashboard data for a student."""
     # Verify authorization
-    if current_user["sub"] != student_id and "instructor" not in current_user.get("roles", []):
-        raise HTTPException(status_code=403, detail="Not authorized")
+    require_self_or_role(current_user, student_id, "instructor")
     
-    # Get overall progress
-    progress_result = await db.execute(
-        select(Progress).where(Progress.student_id == student_id)
-    )
-    progress = progress_result.scalar_one_or_none()
-    
-    if not progress:
-        raise HTTPException(status_code=404, detail="Progress not found")
+    cache_key = await student_cache_key("dashboard", student_id, "student")
+    cached = await get_cached(cache_key)
+    if cached is not None:
+        return cached
     
-    # Get points and level
-    points_result = await db.execute(
-        select(Points).where(Points.student_id == student_id)
-    )
-    points = points_result.scalar_one_or_none()
-    
-    # Get current streak
-    streak_result = await db.execute(
-        select(Streak).where(Streak.student_id == student_id)
+    week_ago = datetime.utcnow() - timedelta(days=7)
+    activity_day = case(
+        (ConceptProgress.last_attempted_at >= week_ago, func.date(ConceptProgress.last_attempted_at))
     )
-    streak = streak_result.scalar_one_or_none()
     
-    # Get recent badges
-    badges_result = await db.execute(
+    # The dashboard reads are independent, so run them concurrently
+    (
+        progress_result,
+        points_result,
+        streak_result,
+        badges_result,
+        concept_rows,
+        next_concepts
+    ) = await execute_concurrently(
+        # Overall progress
+        select(Progress).where(Progress.student_id == student_id),
+        # Points and level
+        select(Points).where(Points.student_id == student_id),
+        # Current streak
+        select(Streak).where(Streak.student_id == student_id),
+        # Recent badges
         select(UserBadge)
-        .options(selectinload(UserBadge.badge))
+        .options(joinedload(UserBadge.badge))
         .where(UserBadge.student_id == student_id)
         .order_by(UserBadge.earned_at.desc())
-        .limit(5)
-    )
-    recent_badges = badges_result.scalars().all()
-    
-    # Get concept stats
-    concept_stats = await db.execute(
+        .limit(5),
+        # Concept stats and weekly activity in one scan: ROLLUP over the activity
+        # day yields a row per day plus the grand total row with the status counts.
+        # Rows outside the week share a NULL day so they only feed the total.
         select(
+            activity_day.label("date"),
+            func.grouping(activity_day).label("is_total"),
             func.count(ConceptProgress.id).label("total"),
-            func.count(case((ConceptProgress.status == ProgressStatus.NOT_STARTED.value, 1))).label("not_started"),
-            func.count(case((ConceptProgress.status == ProgressStatus.IN_PROGRESS.value, 1))).label("in_progress"),
-            func.count(case((ConceptProgress.status == ProgressStatus.COMPLETED.value, 1))).label("completed"),
-            func.count(case((ConceptProgress.status == ProgressStatus.MASTERED.value, 1))).label("mastered")
-        ).where(ConceptProgress.student_id == student_id)
-    )
-    stats = concept_stats.one()
-    
-    # Get weekly activity
-    week_ago = datetime.utcnow() - timedelta(days=7)
-    weekly_activity = await db.execute(
+            func.count(ConceptProgress.id).filter(
+                ConceptProgress.status == ProgressStatus.NOT_STARTED.value
+            ).label("not_started"),
+            func.count(ConceptProgress.id).filter(
+                ConceptProgress.status == ProgressStatus.IN_PROGRESS.value
+            ).label("in_progress"),
+            func.count(ConceptProgress.id).filter(
+                ConceptProgress.status == ProgressStatus.COMPLETED.value
+            ).label("completed"),
+            func.count(ConceptProgress.id).filter(
+                ConceptProgress.status == ProgressStatus.MASTERED.value
+            ).label("mastered")
+        )
+        .where(ConceptProgress.student_id == student_id)
+        .group_by(func.rollup(activity_day)),
+        # Next recommended concepts (simplified)
         select(
-            func.date(ConceptProgress.last_attempted_at).label("date"),
-            func.count(ConceptProgress.id).label("concepts_practiced")
+            ConceptProgress.concept_id,
+            ConceptProgress.current_score,
+            ConceptProgress.attempts
         ).where(
-            and_(
-                ConceptProgress.student_id == student_id,
-                ConceptProgress.last_attempted_at >= week_ago
-            )
-        ).group_by(func.date(ConceptProgress.last_attempted_at))
-    )
-    
-    activity_by_date = {
-        str(row.date): row.concepts_practiced
-        for row in weekly_activity
-    }
-    
-    # Get next recommended concepts (simplified)
-    next_concepts = await db.execute(
-        select(ConceptProgress).where(
             and_(
                 ConceptProgress.student_id == student_id,
                 ConceptProgress.status == ProgressStatus.IN_PROGRESS.value
@@ -104,7 +101,23 @@ async def get_student_dashboard(
         ).limit(3)
     )
     
-    return {
+    progress = progress_result.scalar_one_or_none()
+    if not progress:
+        raise HTTPException(status_code=404, detail="Progress not found")
+    
+    points = points_result.scalar_one_or_none()
+    streak = streak_result.scalar_one_or_none()
+    recent_badges = badges_result.scalars().all()
+    
+    stats = None
+    activity_by_date = {}
+    for row in concept_rows:
+        if row.is_total:
+            stats = row
+        elif row.date is not None:
+            activity_by_date[str(row.date)] = row.total
+    
+    response = {
         "student_id": student_id,
         "overview": {
             "total_concepts": stats.total,
@@ -136,10 +149,13 @@ async def get_student_dashboard(
                 "current_score": c.current_score,
                 "attempts": c.attempts
             }
-            for c in next_concepts.scalars()
+            for c in next_concepts
         ],
         "last_updated": datetime.utcnow()
     }
+    
+    await set_cached(cache_key, response, settings.DASHBOARD_CACHE_TTL)
+    return response
 
 
 @router.get("/instructor/class/{class_id}", response_model=InstructorDashboard)
@@ -150,63 +166,60 @@ async def get_instructor_dashboard(
 ):
     """Get instructor dashboard for a class."""
     # Verify instructor role
-    if "instructor" not in current_user.get("roles", []):
-        raise HTTPException(status_code=403, detail="Not authorized")
+    require_roles(current_user, "instructor")
     
     # In production, would verify instructor has access to this class
     
-    # Get class students (simplified - would come from class service)
-    # For now, get all students with progress
-    students_result = await db.execute(
-        select(Progress.student_id).distinct()
-    )
-    student_ids = [row[0] for row in students_result]
+    cache_key = make_cache_key("dashboard", "instructor", class_id)
+    cached = await get_cached(cache_key)
+    if cached is not None:
+        return cached
     
-    # Calculate class averages
-    class_stats = await db.execute(
+    # Class membership would come from the class service; for now every
+    # student with progress is in the class. The class reads are independent,
+    # so run them concurrently.
+    class_stats, engagement, struggling, top_performers, concept_completion = await execute_concurrently(
+        # Class averages
         select(
             func.avg(Progress.overall_progress).label("avg_progress"),
             func.avg(Progress.total_concepts_mastered).label("avg_mastered"),
             func.count(Progress.student_id).label("total_students")
-        )
-    )
-    stats = class_stats.one()
-    
-    # Get engagement metrics
-    engagement = await db.execute(
+        ),
+        # Engagement metrics
         select(
-            func.count(case((Streak.current_streak > 0, 1))).label("active_students"),
+            func.count().filter(Streak.current_streak > 0).label("active_students"),
             func.avg(Streak.current_streak).label("avg_streak")
-        ).select_from(Streak)
-    )
-    engagement_stats = engagement.one()
-    
-    # Get struggling students (low progress or accuracy)
-    struggling = await db.execute(
-        select(Progress).where(
+        ).select_from(Streak),
+        # Struggling students (low progress or accuracy)
+        select(
+            Progress.student_id,
+            Progress.overall_progress,
+            Progress.total_concepts_mastered
+        ).where(
             Progress.overall_progress < 50
-        ).order_by(Progress.overall_progress).limit(5)
-    )
-    
-    # Get top performers
-    top_performers = await db.execute(
-        select(Progress).order_by(
+        ).order_by(Progress.overall_progress).limit(5),
+        # Top performers
+        select(
+            Progress.student_id,
+            Progress.overall_progress,
+            Progress.total_concepts_mastered,
+            Progress.current_level
+        ).order_by(
             Progress.total_concepts_mastered.desc()
-        ).limit(5)
-    )
-    
-    # Get concept completion rates
-    concept_completion = await db.execute(
+        ).limit(5),
+        # Concept completion rates
         select(
             ConceptProgress.concept_id,
-            func.count(case((ConceptProgress.status == ProgressStatus.MASTERED.value, 1))).label("mastered_count"),
+            func.count().filter(ConceptProgress.status == ProgressStatus.MASTERED.value).label("mastered_count"),
             func.count(ConceptProgress.student_id).label("attempted_count")
         ).group_by(ConceptProgress.concept_id)
         .order_by(func.count(ConceptProgress.student_id).desc())
         .limit(10)
     )
+    stats = class_stats.one()
+    engagement_stats = engagement.one()
     
-    return {
+    response = {
         "class_id": class_id,
         "overview": {
             "total_students": stats.total_students,
@@ -221,7 +234,7 @@ async def get_instructor_dashboard(
                 "progress": s.overall_progress,
                 "concepts_mastered": s.total_concepts_mastered
             }
-            for s in struggling.scalars()
+            for s in struggling
         ],
         "top_performers": [
             {
@@ -230,7 +243,7 @@ async def get_instructor_dashboard(
                 "concepts_mastered": s.total_concepts_mastered,
                 "level": s.current_level
             }
-            for s in top_performers.scalars()
+            for s in top_performers
         ],
         "concept_stats": [
             {
@@ -242,6 +255,9 @@ async def get_instructor_dashboard(
         ],
         "last_updated": datetime.utcnow()
     }
+    
+    await set_cached(cache_key, response, settings.AGGREGATE_CACHE_TTL)
+    return response
 
 
 @router.get("/progress-chart/{student_id}", response_model=ProgressChart)
@@ -253,19 +269,22 @@ async def get_progress_chart(
 ):
     """Get progress chart data."""
     # Verify authorization
-    if current_user["sub"] != student_id and "instructor" not in current_user.get("roles", []):
-        raise HTTPException(status_code=403, detail="Not authorized")
+    require_self_or_role(current_user, student_id, "instructor")
     
     start_date = date.today() - timedelta(days=days)
     
-    # Get daily progress data
+    # Get daily progress data; the running total is a window over the same rows
     daily_progress = await db.execute(
         select(
             Analytics.period_date,
             Analytics.concepts_completed,
             Analytics.concepts_mastered,
+            func.sum(Analytics.concepts_mastered).over(
+                order_by=Analytics.period_date,
+                rows=(None, 0)
+            ).label("cumulative_mastered"),
             Analytics.points_earned,
-            Analytics.time_spent
+            (Analytics.time_spent // 60).label("time_spent_minutes")
         ).where(
             and_(
                 Analytics.student_id == student_id,
@@ -275,19 +294,17 @@ async def get_progress_chart(
         ).order_by(Analytics.period_date)
     )
     
-    chart_data = []
-    cumulative_mastered = 0
-    
-    for row in daily_progress:
-        cumulative_mastered += row.concepts_mastered
-        chart_data.append({
+    chart_data = [
+        {
             "date": str(row.period_date),
             "concepts_completed": row.concepts_completed,
             "concepts_mastered": row.concepts_mastered,
-            "cumulative_mastered": cumulative_mastered,
+            "cumulative_mastered": row.cumulative_mastered,
             "points_earned": row.points_earned,
-            "time_spent_minutes": row.time_spent // 60
-        })
+            "time_spent_minutes": row.time_spent_minutes
+        }
+        for row in daily_progress
+    ]
     
     return {
         "student_id": student_id,
@@ -304,8 +321,12 @@ async def get_engagement_metrics(
 ):
     """Get platform-wide engagement metrics (admin only)."""
     # Only admin can view platform metrics
-    if "admin" not in current_user.get("roles", []):
-        raise HTTPException(status_code=403, detail="Not authorized")
+    require_roles(current_user, "admin")
+    
+    cache_key = make_cache_key("dashboard", "engagement", timeframe, date.today())
+    cached = await get_cached(cache_key)
+    if cached is not None:
+        return cached
     
     # Calculate date range
     if timeframe == "daily":
@@ -315,50 +336,43 @@ async def get_engagement_metrics(
     else:  # monthly
         start_date = date.today() - timedelta(days=30)
     
-    # Get active users
-    active_users = await db.execute(
-        select(func.count(func.distinct(ConceptProgress.student_id))).where(
-            ConceptProgress.last_attempted_at >= start_date
-        )
-    )
-    active_count = active_users.scalar() or 0
-    
-    # Get total users
-    total_users = await db.execute(
-        select(func.count(func.distinct(Progress.student_id)))
-    )
-    total_count = total_users.scalar() or 0
-    
-    # Get average session time (simplified)
-    avg_time = await db.execute(
-        select(func.avg(Analytics.time_spent)).where(
-            and_(
-                Analytics.period == "daily",
-                Analytics.period_date >= start_date
-            )
+    # One round trip: active users and completion share the concept_progress
+    # scan; the user total and session time ride along as scalar subqueries
+    total_users = select(func.count(func.distinct(Progress.student_id))).scalar_subquery()
+    avg_time = select(func.avg(Analytics.time_spent)).where(
+        and_(
+            Analytics.period == "daily",
+            Analytics.period_date >= start_date
         )
-    )
-    avg_session_time = (avg_time.scalar() or 0) // 60  # Convert to minutes
+    ).scalar_subquery()
     
-    # Get completion rates
-    completion_stats = await db.execute(
+    stats = (await db.execute(
         select(
-            func.count(case((ConceptProgress.status == ProgressStatus.COMPLETED.value, 1))).label("completed"),
-            func.count(case((ConceptProgress.status == ProgressStatus.MASTERED.value, 1))).label("mastered"),
-            func.count(ConceptProgress.id).label("total")
+            func.count(func.distinct(ConceptProgress.student_id)).label("active"),
+            func.count().filter(ConceptProgress.status == ProgressStatus.COMPLETED.value).label("completed"),
+            func.count().filter(ConceptProgress.status == ProgressStatus.MASTERED.value).label("mastered"),
+            func.count(ConceptProgress.id).label("total"),
+            total_users.label("total_users"),
+            avg_time.label("avg_time")
         ).where(
             ConceptProgress.last_attempted_at >= start_date
         )
-    )
-    completion = completion_stats.one()
+    )).one()
     
-    return {
+    active_count = stats.active or 0
+    total_count = stats.total_users or 0
+    avg_session_time = (stats.avg_time or 0) // 60  # Convert to minutes
+    
+    response = {
         "timeframe": timeframe,
         "active_users": active_count,
         "total_users": total_count,
         "engagement_rate": (active_count / total_count * 100) if total_count > 0 else 0,
         "average_session_minutes": avg_session_time,
-        "completion_rate": (completion.completed / completion.total * 100) if completion.total > 0 else 0,
-        "mastery_rate": (completion.mastered / completion.total * 100) if completion.total > 0 else 0,
+        "completion_rate": (stats.completed / stats.total * 100) if stats.total > 0 else 0,
+        "mastery_rate": (stats.mastered / stats.total * 100) if stats.total > 0 else 0,
         "generated_at": datetime.utcnow()
-    }
\ No newline at end of file
+    }
+    
+    await set_cached(cache_key, response, settings.AGGREGATE_CACHE_TTL)
+    return response
\ No newline at end of file
@@ -2,12 +2,18 @@
 
 from typing import List, Optional, Dict, Any
 from datetime import datetime, date, timedelta
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, func
+from sqlalchemy import select, update, and_, case, func, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import selectinload
+from sqlalchemy import inspect as sa_inspect
 import structlog
 
-from app.core.database import get_db
+from app.core.cache import get_cached, set_cached, get_generation, make_cache_key, make_etag, student_cache_key, invalidate_student
+from app.core.config import settings
+from app.core.database import get_db, utc_now
+from app.core.dependencies import require_roles, require_self_or_role
 from app.core.auth import get_current_user
 from app.models.gamification import Points, PointHistory, Badge, UserBadge, Streak, Achievement
 from app.schemas.gamification import (
@@ -15,11 +21,18 @@ from app.schemas.gamification import (
     StreakResponse, AchievementCreate, AchievementResponse, LeaderboardEntry
 )
 from app.gamification.points_engine import PointsEngine
-from app.gamification.badge_engine import BadgeEngine
+from app.gamification.badge_engine import BadgeEngine, BADGE_CACHE_GENERATION_KEY, BADGE_CACHE_TTL
 
 logger = structlog.get_logger()
 router = APIRouter(prefix="/gamification", tags=["gamification"])
 
+_LEADERBOARD_COLUMNS = {
+    "daily": Points.points_last_1d,
+    "weekly": Points.points_last_7d,
+    "monthly": Points.points_last_30d,
+    "all": Points.total_points,
+}
+
 
 @router.get("/points/{student_id}", response_model=PointsResponse)
 async def get_student_points(
@@ -29,8 +42,7 @@ async def get_student_points(
 ):
     """Get points for a student."""
     # Verify authorization
-    if current_user["sub"] != student_id and "instructor" not in current_user.get("roles", []):
-        raise HTTPException(status_code=403, detail="Not authorized")
+    require_self_or_role(current_user, student_id, "instructor")
     
     result = await db.execute(
         select(Points).where(Points.student_id == student_id)
@@ -38,11 +50,16 @@ async def get_student_points(
     points = result.scalar_one_or_none()
     
     if not points:
-        # Create default points record
-        points = Points(student_id=student_id)
-        db.add(points)
+        # Create default points record; a concurrent first request may win the insert
+        await db.execute(
+            pg_insert(Points)
+            .values(student_id=student_id)
+            .on_conflict_do_nothing(index_elements=["student_id"])
+        )
         await db.commit()
-        await db.refresh(points)
+        points = (await db.execute(
+            select(Points).where(Points.student_id == student_id)
+        )).scalar_one()
     
     return points
 
@@ -58,8 +75,7 @@ async def award_points(
 ):
     """Award points to a student."""
     # Only instructors or system can award points
-    if "instructor" not in current_user.get("roles", []) and "system" not in current_user.get("roles", []):
-        raise HTTPException(status_code=403, detail="Not authorized to award points")
+    require_roles(current_user, "instructor", "system")
     
     engine = PointsEngine(db)
     result = await engine.award_points(student_id, points, reason, concept_id)
@@ -72,6 +88,10 @@ async def award_points(
         {"points": points, "total_points": result["total_points"]}
     )
     
+    # Commit the points and any badges together
+    await db.commit()
+    await invalidate_student("dashboard", student_id)
+    
     result["earned_badges"] = earned_badges
     return result
 
@@ -79,40 +99,78 @@ async def award_points(
 @router.get("/points/{student_id}/history", response_model=List[PointHistoryResponse])
 async def get_point_history(
     student_id: str,
+    response: Response,
     limit: int = Query(50, ge=1, le=200),
-    offset: int = Query(0, ge=0),
+    before: Optional[datetime] = Query(None, description="awarded_at of the last entry on the previous page"),
+    before_id: Optional[str] = Query(None, description="id of the last entry on the previous page"),
     current_user: dict = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get point history for a student."""
+    """Get point history for a student, newest first.
+    
+    Pages with a keyset cursor: pass the X-Next-Before and X-Next-Before-Id
+    headers from one page as before and before_id to fetch the next.
+    """
     # Verify authorization
-    if current_user["sub"] != student_id and "instructor" not in current_user.get("roles", []):
-        raise HTTPException(status_code=403, detail="Not authorized")
+    require_self_or_role(current_user, student_id, "instructor")
+    
+    query = select(PointHistory).where(PointHistory.student_id == student_id)
+    if before is not None:
+        # Awards in one transaction share a timestamp, so ties break on id
+        if before_id is not None:
+            query = query.where(
+                tuple_(PointHistory.awarded_at, PointHistory.id) < tuple_(before, before_id)
+            )
+        else:
+            query = query.where(PointHistory.awarded_at < before)
     
     result = await db.execute(
-        select(PointHistory)
-        .where(PointHistory.student_id == student_id)
-        .order_by(PointHistory.awarded_at.desc())
-        .offset(offset)
+        query
+        .order_by(PointHistory.awarded_at.desc(), PointHistory.id.desc())
         .limit(limit)
     )
+    history = result.scalars().all()
     
-    return result.scalars().all()
+    if len(history) == limit:
+        last = history[-1]
+        response.headers["X-Next-Before"] = last.awarded_at.isoformat()
+        response.headers["X-Next-Before-Id"] = str(last.id)
+    
+    return history
 
 
 @router.get("/badges", response_model=List[BadgeResponse])
 async def get_all_badges(
+    request: Request,
+    response: Response,
     category: Optional[str] = Query(None),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get all available badges."""
-    query = select(Badge).where(Badge.is_active == True)
+    """Get all available badges.
     
-    if category:
-        query = query.where(Badge.category == category)
+    The catalog rarely changes, so it is cached until the badge generation
+    is bumped and tagged with an ETag for conditional requests.
+    """
+    generation = await get_generation(BADGE_CACHE_GENERATION_KEY)
+    cache_key = make_cache_key("badges", "all", generation, category)
+    cached = await get_cached(cache_key)
     
-    result = await db.execute(query.order_by(Badge.points_value))
-    return result.scalars().all()
+    if cached is None:
+        query = select(*Badge.__table__.c).where(Badge.is_active == True)
+        
+        if category:
+            query = query.where(Badge.category == category)
+        
+        result = await db.execute(query.order_by(Badge.points_value))
+        badges = [dict(row) for row in result.mappings()]
+        cached = {"etag": make_etag(badges), "badges": badges}
+        await set_cached(cache_key, cached, BADGE_CACHE_TTL)
+    
+    if request.headers.get("if-none-match") == cached["etag"]:
+        return Response(status_code=304, headers={"ETag": cached["etag"]})
+    
+    response.headers["ETag"] = cached["etag"]
+    return cached["badges"]
 
 
 @router.get("/badges/{student_id}", response_model=List[UserBadgeResponse])
@@ -123,8 +181,7 @@ async def get_student_badges(
 ):
     """Get badges earned by a student."""
     # Verify authorization
-    if current_user["sub"] != student_id and "instructor" not in current_user.get("roles", []):
-        raise HTTPException(status_code=403, detail="Not authorized")
+    require_self_or_role(current_user, student_id, "instructor")
     
     result = await db.execute(
         select(UserBadge)
@@ -136,37 +193,77 @@ async def get_student_badges(
     return result.scalars().all()
 
 
+def _effective_streak_query(student_id: str, today: date):
+    """Select a student's streak with a lapsed streak reported as broken."""
+    lapsed = Streak.last_activity_date < today - timedelta(days=1)
+    return select(
+        *(column for column in Streak.__table__.c if column.key not in ("current_streak", "streak_started_date")),
+        case((lapsed, 0), else_=Streak.current_streak).label("current_streak"),
+        case((lapsed, None), else_=Streak.streak_started_date).label("streak_started_date")
+    ).where(Streak.student_id == student_id)
+
+
 @router.get("/streaks/{student_id}", response_model=StreakResponse)
 async def get_student_streak(
     student_id: str,
     current_user: dict = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get streak information for a student."""
+    """Get streak information for a student.
+    
+    Read-only apart from creating a missing record: a lapsed streak is
+    reported as 0 here and persisted by /streaks/reset-expired.
+    """
     # Verify authorization
-    if current_user["sub"] != student_id and "instructor" not in current_user.get("roles", []):
-        raise HTTPException(status_code=403, detail="Not authorized")
+    require_self_or_role(current_user, student_id, "instructor")
+    
+    # Keyed on the date because the effective streak changes at midnight
+    today = date.today()
+    cache_key = await student_cache_key("dashboard", student_id, "streak", today)
+    cached = await get_cached(cache_key)
+    if cached is not None:
+        return cached
+    
+    row = (await db.execute(_effective_streak_query(student_id, today))).mappings().one_or_none()
+    
+    if row is None:
+        # Create default streak record; a concurrent first request may win the insert
+        await db.execute(
+            pg_insert(Streak)
+            .values(student_id=student_id)
+            .on_conflict_do_nothing(index_elements=["student_id"])
+        )
+        await db.commit()
+        row = (await db.execute(_effective_streak_query(student_id, today))).mappings().one()
+    
+    streak = dict(row)
+    await set_cached(cache_key, streak, settings.DASHBOARD_CACHE_TTL)
+    
+    return streak
+
+
+@router.post("/streaks/reset-expired", response_model=Dict[str, Any])
+async def reset_expired_streaks(
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Reset every lapsed streak in one statement (system only, run daily)."""
+    require_roles(current_user, "admin", "system")
     
     result = await db.execute(
-        select(Streak).where(Streak.student_id == student_id)
+        update(Streak)
+        .where(
+            Streak.last_activity_date < date.today() - timedelta(days=1),
+            Streak.current_streak > 0
+        )
+        .values(current_streak=0, streak_started_date=None)
+        .execution_options(synchronize_session=False)
     )
-    streak = result.scalar_one_or_none()
-    
-    if not streak:
-        # Create default streak record
-        streak = Streak(student_id=student_id)
-        db.add(streak)
-        await db.commit()
-        await db.refresh(streak)
+    await db.commit()
     
-    # Check if streak needs to be reset
-    if streak.last_activity_date and streak.last_activity_date < date.today() - timedelta(days=1):
-        # Streak broken
-        streak.current_streak = 0
-        streak.streak_started_date = None
-        await db.commit()
+    logger.info("Expired streaks reset", streaks=result.rowcount)
     
-    return streak
+    return {"streaks_reset": result.rowcount}
 
 
 @router.post("/streaks/{student_id}/update", response_model=StreakResponse)
@@ -177,44 +274,42 @@ async def update_streak(
 ):
     """Update streak for today's activity."""
     # Verify user is updating their own streak
-    if current_user["sub"] != student_id:
-        raise HTTPException(status_code=403, detail="Not authorized")
-    
-    result = await db.execute(
-        select(Streak).where(Streak.student_id == student_id)
+    require_self_or_role(current_user, student_id)
+    
+    # Record today's activity in one upsert: a new student starts at 1, a
+    # streak active yesterday continues, anything older starts over. The
+    # WHERE skips the update when today is already recorded.
+    today = date.today()
+    continues = Streak.last_activity_date == today - timedelta(days=1)
+    next_streak = case((continues, Streak.current_streak + 1), else_=1)
+    stmt = pg_insert(Streak).values(
+        student_id=student_id,
+        current_streak=1,
+        longest_streak=1,
+        last_activity_date=today,
+        streak_started_date=today,
+        total_active_days=1
     )
-    streak = result.scalar_one_or_none()
-    
-    if not streak:
-        streak = Streak(
-            student_id=student_id,
-            current_streak=1,
-            longest_streak=1,
-            streak_started_date=date.today(),
-            total_active_days=1
-        )
-        db.add(streak)
-    else:
-        # Check if already updated today
-        if streak.last_activity_date == date.today():
-            return streak
-        
-        # Check if streak continues
-        if streak.last_activity_date == date.today() - timedelta(days=1):
-            # Continue streak
-            streak.current_streak += 1
-            if streak.current_streak > streak.longest_streak:
-                streak.longest_streak = streak.current_streak
-        else:
-            # Start new streak
-            streak.current_streak = 1
-            streak.streak_started_date = date.today()
-        
-        streak.last_activity_date = date.today()
-        streak.total_active_days += 1
-    
-    await db.commit()
-    await db.refresh(streak)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["student_id"],
+        set_={
+            "current_streak": next_streak,
+            "longest_streak": func.greatest(Streak.longest_streak, next_streak),
+            "streak_started_date": case((continues, Streak.streak_started_date), else_=today),
+            "last_activity_date": today,
+            "total_active_days": Streak.total_active_days + 1,
+            "updated_at": utc_now()
+        },
+        where=Streak.last_activity_date.is_distinct_from(today)
+    ).returning(Streak)
+    
+    streak = (await db.execute(stmt)).scalar_one_or_none()
+    
+    if streak is None:
+        # Already updated today
+        return (await db.execute(
+            select(Streak).where(Streak.student_id == student_id)
+        )).scalar_one()
     
     # Check for streak-related badges
     badge_engine = BadgeEngine(db)
@@ -224,9 +319,21 @@ async def update_streak(
         {"streak_days": streak.current_streak}
     )
     
+    # Commit the streak and any badges together
+    await db.commit()
+    await invalidate_student("dashboard", student_id)
+    
     return streak
 
 
+def _achievement_fields(achievement: Achievement) -> Dict[str, Any]:
+    """Map an achievement to its column names, so metadata_ is served as metadata."""
+    return {
+        attr.columns[0].name: getattr(achievement, attr.key)
+        for attr in sa_inspect(Achievement).column_attrs
+    }
+
+
 @router.get("/achievements/{student_id}", response_model=List[AchievementResponse])
 async def get_student_achievements(
     student_id: str,
@@ -237,8 +344,7 @@ async def get_student_achievements(
 ):
     """Get achievements for a student."""
     # Verify authorization
-    if current_user["sub"] != student_id and "instructor" not in current_user.get("roles", []):
-        raise HTTPException(status_code=403, detail="Not authorized")
+    require_self_or_role(current_user, student_id, "instructor")
     
     query = select(Achievement).where(Achievement.student_id == student_id)
     
@@ -248,7 +354,7 @@ async def get_student_achievements(
     query = query.order_by(Achievement.achieved_at.desc()).limit(limit)
     
     result = await db.execute(query)
-    return result.scalars().all()
+    return [_achievement_fields(achievement) for achievement in result.scalars()]
 
 
 @router.post("/achievements", response_model=AchievementResponse)
@@ -259,16 +365,17 @@ async def create_achievement(
 ):
     """Record a new achievement."""
     # Only system or instructors can create achievements
-    if "instructor" not in current_user.get("roles", []) and "system" not in current_user.get("roles", []):
-        raise HTTPException(status_code=403, detail="Not authorized")
+    require_roles(current_user, "instructor", "system")
     
-    db_achievement = Achievement(**achievement.dict())
+    # The schema's metadata field maps to the metadata_ attribute
+    data = achievement.model_dump()
+    data["metadata_"] = data.pop("metadata", None)
+    db_achievement = Achievement(**data)
     db.add(db_achievement)
     
     try:
         await db.commit()
-        await db.refresh(db_achievement)
-        return db_achievement
+        return _achievement_fields(db_achievement)
     except Exception as e:
         logger.error("Failed to create achievement", error=str(e))
         await db.rollback()
@@ -283,36 +390,20 @@ async def get_points_leaderboard(
     db: AsyncSession = Depends(get_db)
 ):
     """Get points leaderboard."""
-    # Build query based on timeframe
-    if timeframe == "all":
-        query = select(
-            Points.student_id,
-            Points.total_points,
-            Points.current_level
-        ).order_by(Points.total_points.desc())
-    else:
-        # Calculate points earned in timeframe
-        date_filter = datetime.utcnow()
-        if timeframe == "daily":
-            date_filter = datetime.utcnow() - timedelta(days=1)
-        elif timeframe == "weekly":
-            date_filter = datetime.utcnow() - timedelta(days=7)
-        elif timeframe == "monthly":
-            date_filter = datetime.utcnow() - timedelta(days=30)
-        
-        query = select(
-            PointHistory.student_id,
-            func.sum(PointHistory.points_awarded).label("total_points"),
-            func.max(Points.current_level).label("current_level")
-        ).join(
-            Points, Points.student_id == PointHistory.student_id
-        ).where(
-            PointHistory.awarded_at >= date_filter
-        ).group_by(
-            PointHistory.student_id
-        ).order_by(
-            func.sum(PointHistory.points_awarded).desc()
-        )
+    cache_key = make_cache_key("leaderboard", "points", timeframe, limit)
+    cached = await get_cached(cache_key)
+    if cached is not None:
+        return cached
+    
+    # Windowed boards read the rolling-sum column kept on Points
+    points_column = _LEADERBOARD_COLUMNS[timeframe]
+    query = select(
+        Points.student_id,
+        points_column.label("total_points"),
+        Points.current_level
+    ).order_by(points_column.desc())
+    if timeframe != "all":
+        query = query.where(points_column > 0)
     
     query = query.limit(limit)
     result = await db.execute(query)
@@ -326,9 +417,25 @@ async def get_points_leaderboard(
             "level": row.current_level
         })
     
+    await set_cached(cache_key, leaderboard, settings.LEADERBOARD_CACHE_TTL)
     return leaderboard
 
 
+@router.post("/leaderboard/refresh", response_model=Dict[str, Any])
+async def refresh_points_leaderboard(
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Age expired points out of the rolling leaderboards (system only)."""
+    require_roles(current_user, "admin", "system")
+    
+    engine = PointsEngine(db)
+    refreshed = await engine.refresh_rolling_points()
+    await db.commit()
+    
+    return {"students_refreshed": refreshed}
+
+
 @router.get("/leaderboard/streaks", response_model=List[Dict[str, Any]])
 async def get_streak_leaderboard(
     limit: int = Query(10, ge=1, le=100),
@@ -336,6 +443,11 @@ async def get_streak_leaderboard(
     db: AsyncSession = Depends(get_db)
 ):
     """Get streak leaderboard."""
+    cache_key = make_cache_key("leaderboard", "streaks", limit)
+    cached = await get_cached(cache_key)
+    if cached is not None:
+        return cached
+    
     result = await db.execute(
         select(
             Streak.student_id,
@@ -356,4 +468,5 @@ async def get_streak_leaderboard(
             "total_active_days": row.total_active_days
         })
     
+    await set_cached(cache_key, leaderboard, settings.LEADERBOARD_CACHE_TTL)
     return leaderboard
\ No newline at end of file
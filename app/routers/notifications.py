@@ -1,17 +1,22 @@
 """Notification endpoints for progress updates."""
 
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Mapping
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
+from types import MappingProxyType
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
+import orjson
 import structlog
-import json
 
+from app.core.cache import make_etag
 from app.core.database import get_db
+from app.core.dependencies import require_roles, require_self_or_role
 from app.core.auth import get_current_user
 from app.core.messaging import send_message
-from app.models.gamification import UserBadge, Achievement
+from app.models.gamification import Achievement
+from app.gamification.badge_engine import BadgeEngine
+from app.notifications.dispatcher import notification_dispatcher
+from app.notifications.notification_engine import publish_notifications
 from app.schemas.notifications import (
     NotificationCreate, NotificationResponse, NotificationPreferences,
     NotificationBatch
@@ -20,21 +25,54 @@ from app.schemas.notifications import (
 logger = structlog.get_logger()
 router = APIRouter(prefix="/notifications", tags=["notifications"])
 
+# Naive datetimes in payloads are UTC; serialize them with a Z suffix
+_ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z
+
+# Milestone messages by milestone type, formatted with the milestone value
+_MILESTONE_TEMPLATES: Mapping[str, str] = MappingProxyType({
+    "concepts_mastered": "Amazing! You've mastered {value} concepts!",
+    "streak_days": "Incredible! You're on a {value}-day learning streak!",
+    "level_up": "Level Up! You've reached level {value}!",
+    "points_milestone": "Milestone reached! You've earned {value} points!",
+})
+
+_REMINDER_MESSAGES: Mapping[str, str] = MappingProxyType({
+    "daily_practice": "Time for your daily practice! Keep your streak alive!",
+    "incomplete_concept": "You have concepts waiting to be completed. Ready to continue?",
+    "review_needed": "Some concepts need review to maintain mastery. Let's refresh!",
+    "goal_reminder": "You're close to reaching your weekly goal. One more push!",
+})
+_DEFAULT_REMINDER_MESSAGE = "Don't forget to practice today!"
+
+_WEEKLY_SUMMARY_TEMPLATE = (
+    "Your Weekly Progress Summary:\n"
+    "\n"
+    "✅ Concepts Completed: {concepts_completed}\n"
+    "🎯 Concepts Mastered: {concepts_mastered}\n"
+    "🏆 Points Earned: {points_earned}\n"
+    "🔥 Current Streak: {current_streak} days\n"
+    "⏱️ Time Spent: {time_spent_minutes} minutes\n"
+    "🥇 Badges Earned: {badges_earned}\n"
+    "\n"
+    "Keep up the great work!"
+)
+
+# Clients may reuse preferences briefly, then revalidate with the ETag
+_PREFERENCES_CACHE_CONTROL = "private, max-age=30"
+
 
 @router.post("/progress-update")
 async def send_progress_notification(
     notification: NotificationCreate,
-    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Send progress update notification."""
     # Only system or instructors can send notifications
-    if "instructor" not in current_user.get("roles", []) and "system" not in current_user.get("roles", []):
-        raise HTTPException(status_code=403, detail="Not authorized")
+    require_roles(current_user, "instructor", "system")
     
     # Queue notification
-    background_tasks.add_task(
+    _queue_send(
         _send_notification,
         notification.student_id,
         notification.type,
@@ -50,41 +88,32 @@ async def send_progress_notification(
 async def notify_badge_earned(
     student_id: str,
     badge_id: str,
-    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Notify student of earned badge."""
     # Get badge details
-    result = await db.execute(
-        select(UserBadge).where(
-            and_(
-                UserBadge.student_id == student_id,
-                UserBadge.badge_id == badge_id
-            )
-        ).options(selectinload(UserBadge.badge))
-    )
-    user_badge = result.scalar_one_or_none()
+    badge = await BadgeEngine(db).get_earned_badge(student_id, badge_id)
     
-    if not user_badge:
+    if not badge:
         raise HTTPException(status_code=404, detail="Badge not found")
     
     # Queue notification
-    background_tasks.add_task(
+    _queue_send(
         _send_notification,
         student_id,
         "badge_earned",
-        f"New Badge: {user_badge.badge.name}!",
-        f"Congratulations! You've earned the {user_badge.badge.name} badge. {user_badge.badge.description}",
+        f"New Badge: {badge.name}!",
+        f"Congratulations! You've earned the {badge.name} badge. {badge.description}",
         {
             "badge_id": str(badge_id),
-            "badge_name": user_badge.badge.name,
-            "icon_url": user_badge.badge.icon_url,
-            "points_value": user_badge.badge.points_value
+            "badge_name": badge.name,
+            "icon_url": badge.icon_url,
+            "points_value": badge.points_value
         }
     )
     
-    return {"status": "queued", "badge_name": user_badge.badge.name}
+    return {"status": "queued", "badge_name": badge.name}
 
 
 @router.post("/milestone-reached")
@@ -92,24 +121,18 @@ async def notify_milestone(
     student_id: str,
     milestone_type: str,
     milestone_value: Any,
-    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_user)
 ):
     """Notify student of reached milestone."""
-    milestone_messages = {
-        "concepts_mastered": f"Amazing! You've mastered {milestone_value} concepts!",
-        "streak_days": f"Incredible! You're on a {milestone_value}-day learning streak!",
-        "level_up": f"Level Up! You've reached level {milestone_value}!",
-        "points_milestone": f"Milestone reached! You've earned {milestone_value} points!",
-    }
-    
-    message = milestone_messages.get(
-        milestone_type,
-        f"Congratulations on reaching {milestone_value} {milestone_type}!"
-    )
+    # Format only the template that applies
+    template = _MILESTONE_TEMPLATES.get(milestone_type)
+    if template is not None:
+        message = template.format(value=milestone_value)
+    else:
+        message = f"Congratulations on reaching {milestone_value} {milestone_type}!"
     
     # Queue notification
-    background_tasks.add_task(
+    _queue_send(
         _send_notification,
         student_id,
         "milestone",
@@ -127,7 +150,6 @@ async def notify_milestone(
 @router.post("/weekly-summary")
 async def send_weekly_summary(
     student_id: str,
-    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -144,26 +166,18 @@ async def send_weekly_summary(
         "badges_earned": 2
     }
     
-    message = f"""
-    Your Weekly Progress Summary:
-    
-    ✅ Concepts Completed: {summary_data['concepts_completed']}
-    🎯 Concepts Mastered: {summary_data['concepts_mastered']}
-    🏆 Points Earned: {summary_data['points_earned']}
-    🔥 Current Streak: {summary_data['current_streak']} days
-    ⏱️ Time Spent: {summary_data['time_spent'] // 60} minutes
-    🥇 Badges Earned: {summary_data['badges_earned']}
-    
-    Keep up the great work!
-    """
+    message = _WEEKLY_SUMMARY_TEMPLATE.format(
+        time_spent_minutes=summary_data["time_spent"] // 60,
+        **summary_data
+    )
     
     # Queue notification
-    background_tasks.add_task(
+    _queue_send(
         _send_notification,
         student_id,
         "weekly_summary",
         "Your Weekly Progress Summary",
-        message.strip(),
+        message,
         summary_data
     )
     
@@ -174,21 +188,13 @@ async def send_weekly_summary(
 async def send_reminder(
     student_id: str,
     reminder_type: str,
-    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_user)
 ):
     """Send learning reminder."""
-    reminders = {
-        "daily_practice": "Time for your daily practice! Keep your streak alive!",
-        "incomplete_concept": "You have concepts waiting to be completed. Ready to continue?",
-        "review_needed": "Some concepts need review to maintain mastery. Let's refresh!",
-        "goal_reminder": "You're close to reaching your weekly goal. One more push!"
-    }
-    
-    message = reminders.get(reminder_type, "Don't forget to practice today!")
+    message = _REMINDER_MESSAGES.get(reminder_type, _DEFAULT_REMINDER_MESSAGE)
     
     # Queue notification
-    background_tasks.add_task(
+    _queue_send(
         _send_notification,
         student_id,
         "reminder",
@@ -203,30 +209,33 @@ async def send_reminder(
 @router.post("/batch")
 async def send_batch_notifications(
     batch: NotificationBatch,
-    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_user)
 ):
     """Send batch notifications."""
     # Only admin can send batch notifications
-    if "admin" not in current_user.get("roles", []):
-        raise HTTPException(status_code=403, detail="Not authorized")
+    require_roles(current_user, "admin")
     
-    queued_count = 0
+    # Every recipient gets the same content, so build the payloads in one pass
+    # and publish them as batched messages instead of one publish per student
+    timestamp = datetime.utcnow()
+    data = batch.data or {}
+    payloads = [
+        {
+            "student_id": student_id,
+            "type": batch.type,
+            "title": batch.title,
+            "message": batch.message,
+            "data": data,
+            "timestamp": timestamp
+        }
+        for student_id in batch.student_ids
+    ]
     
-    for student_id in batch.student_ids:
-        background_tasks.add_task(
-            _send_notification,
-            student_id,
-            batch.type,
-            batch.title,
-            batch.message,
-            batch.data
-        )
-        queued_count += 1
+    _queue_send(publish_notifications, payloads)
     
     return {
         "status": "queued",
-        "queued_count": queued_count,
+        "queued_count": len(payloads),
         "type": batch.type
     }
 
@@ -234,17 +243,18 @@ async def send_batch_notifications(
 @router.get("/preferences/{student_id}", response_model=NotificationPreferences)
 async def get_notification_preferences(
     student_id: str,
+    request: Request,
+    response: Response,
     current_user: dict = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Get notification preferences for a student."""
     # Verify authorization
-    if current_user["sub"] != student_id and "instructor" not in current_user.get("roles", []):
-        raise HTTPException(status_code=403, detail="Not authorized")
+    require_self_or_role(current_user, student_id, "instructor")
     
     # In production, this would fetch from a preferences table
     # For now, return defaults
-    return {
+    preferences = {
         "student_id": student_id,
         "email_enabled": True,
         "push_enabled": True,
@@ -262,6 +272,14 @@ async def get_notification_preferences(
             "end": "08:00"
         }
     }
+    
+    etag = make_etag(preferences)
+    headers = {"ETag": etag, "Cache-Control": _PREFERENCES_CACHE_CONTROL}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    response.headers.update(headers)
+    return preferences
 
 
 @router.put("/preferences/{student_id}", response_model=NotificationPreferences)
@@ -273,8 +291,7 @@ async def update_notification_preferences(
 ):
     """Update notification preferences."""
     # Verify user is updating their own preferences
-    if current_user["sub"] != student_id:
-        raise HTTPException(status_code=403, detail="Not authorized")
+    require_self_or_role(current_user, student_id)
     
     # In production, this would update preferences in database
     # For now, just return the updated preferences
@@ -297,13 +314,13 @@ async def _send_notification(
             "title": title,
             "message": message,
             "data": data or {},
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         }
         
         # Send via messaging service (SNS/SQS)
         await send_message(
             topic="progress-notifications",
-            message=json.dumps(payload),
+            message=orjson.dumps(payload, option=_ORJSON_OPTIONS).decode(),
             attributes={
                 "student_id": student_id,
                 "notification_type": notification_type
@@ -323,4 +340,10 @@ async def _send_notification(
             type=notification_type,
             error=str(e)
         )
-        # Don't raise - notifications are best effort
\ No newline at end of file
+        # Don't raise - notifications are best effort
+
+
+def _queue_send(send, *args: Any) -> None:
+    """Hand a send to the dispatcher, failing the request if it was dropped."""
+    if not notification_dispatcher.submit(send, *args):
+        raise HTTPException(status_code=503, detail="Notification queue unavailable")
\ No newline at end of file
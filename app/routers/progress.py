@@ -1,13 +1,20 @@
 """Progress tracking endpoints."""
 
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator, Tuple, Set, FrozenSet
+from collections import defaultdict
 from datetime import datetime, date
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, or_, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+import orjson
 import structlog
 
-from app.core.database import get_db
+from app.core.cache import get_cached, set_cached, make_cache_key, make_etag, student_cache_key, invalidate_student
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, get_db, execute_concurrently
+from app.core.dependencies import require_self_or_role
 from app.core.auth import get_current_user
 from app.models.progress import Progress, ConceptProgress, ProgressStatus
 from app.schemas.progress import (
@@ -19,6 +26,12 @@ from app.schemas.progress import (
 logger = structlog.get_logger()
 router = APIRouter(prefix="/progress", tags=["progress"])
 
+# Clients may reuse a progress response briefly, then revalidate with its ETag
+_PROGRESS_CACHE_CONTROL = "private, max-age=30"
+
+CONCEPT_STREAM_CHUNK_SIZE = 100  # Rows fetched per server-side cursor round trip
+BULK_UPSERT_CHUNK_SIZE = 1000  # Rows per multi-row upsert; asyncpg allows 32767 bind parameters
+
 
 @router.post("/", response_model=ProgressResponse)
 async def create_progress(
@@ -28,10 +41,9 @@ async def create_progress(
 ):
     """Create new progress record."""
     # Verify user is creating progress for themselves or is an instructor
-    if current_user["sub"] != str(progress.student_id) and "instructor" not in current_user.get("roles", []):
-        raise HTTPException(status_code=403, detail="Not authorized to create progress for this student")
+    require_self_or_role(current_user, str(progress.student_id), "instructor")
     
-    db_progress = Progress(**progress.dict())
+    db_progress = Progress(**progress.model_dump())
     db.add(db_progress)
     
     try:
@@ -48,23 +60,37 @@ async def create_progress(
 @router.get("/{student_id}", response_model=ProgressResponse)
 async def get_student_progress(
     student_id: str,
+    request: Request,
+    response: Response,
     current_user: dict = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Get overall progress for a student."""
     # Verify authorization
-    if current_user["sub"] != student_id and "instructor" not in current_user.get("roles", []):
-        raise HTTPException(status_code=403, detail="Not authorized to view this student's progress")
+    require_self_or_role(current_user, student_id, "instructor")
     
-    result = await db.execute(
-        select(Progress).where(Progress.student_id == student_id)
-    )
-    progress = result.scalar_one_or_none()
+    cache_key = await student_cache_key("dashboard", student_id, "progress")
+    cached = await get_cached(cache_key)
     
-    if not progress:
-        raise HTTPException(status_code=404, detail="Progress not found")
+    if cached is None:
+        result = await db.execute(
+            select(*Progress.__table__.c).where(Progress.student_id == student_id)
+        )
+        progress = result.mappings().one_or_none()
+        
+        if not progress:
+            raise HTTPException(status_code=404, detail="Progress not found")
+        
+        progress = dict(progress)
+        cached = {"etag": make_etag(progress), "progress": progress}
+        await set_cached(cache_key, cached, settings.DASHBOARD_CACHE_TTL)
     
-    return progress
+    headers = {"ETag": cached["etag"], "Cache-Control": _PROGRESS_CACHE_CONTROL}
+    if request.headers.get("if-none-match") == cached["etag"]:
+        return Response(status_code=304, headers=headers)
+    
+    response.headers.update(headers)
+    return cached["progress"]
 
 
 @router.get("/{student_id}/summary", response_model=ProgressSummary)
@@ -75,47 +101,55 @@ async def get_progress_summary(
 ):
     """Get detailed progress summary."""
     # Verify authorization
-    if current_user["sub"] != student_id and "instructor" not in current_user.get("roles", []):
-        raise HTTPException(status_code=403, detail="Not authorized")
+    require_self_or_role(current_user, student_id, "instructor")
     
-    # Get overall progress
-    result = await db.execute(
-        select(Progress).where(Progress.student_id == student_id)
-    )
-    progress = result.scalar_one_or_none()
+    # Every concept progress write bumps the student's dashboard generation,
+    # so the cached status counts never outlive a transition
+    cache_key = await student_cache_key("dashboard", student_id, "summary")
+    cached = await get_cached(cache_key)
+    if cached is not None:
+        return cached
     
-    if not progress:
-        raise HTTPException(status_code=404, detail="Progress not found")
-    
-    # Get concept progress stats
-    concept_stats = await db.execute(
+    # The summary reads are independent, so run them concurrently
+    progress_result, concept_stats, recent_concepts = await execute_concurrently(
+        # Overall progress
+        select(Progress).where(Progress.student_id == student_id),
+        # Concept progress stats
         select(
             ConceptProgress.status,
             func.count(ConceptProgress.id).label("count")
         ).where(
             ConceptProgress.student_id == student_id
-        ).group_by(ConceptProgress.status)
-    )
-    
-    status_counts = {row.status: row.count for row in concept_stats}
-    
-    # Get recent activity
-    recent_concepts = await db.execute(
+        ).group_by(ConceptProgress.status),
+        # Recent activity
         select(ConceptProgress).where(
             ConceptProgress.student_id == student_id
         ).order_by(ConceptProgress.last_attempted_at.desc()).limit(10)
     )
     
-    return {
-        "overall_progress": progress,
-        "concept_stats": {
-            "not_started": status_counts.get(ProgressStatus.NOT_STARTED.value, 0),
-            "in_progress": status_counts.get(ProgressStatus.IN_PROGRESS.value, 0),
-            "completed": status_counts.get(ProgressStatus.COMPLETED.value, 0),
-            "mastered": status_counts.get(ProgressStatus.MASTERED.value, 0),
+    progress = progress_result.scalar_one_or_none()
+    
+    if not progress:
+        raise HTTPException(status_code=404, detail="Progress not found")
+    
+    status_counts = dict(concept_stats.all())
+    
+    summary = ProgressSummary.model_validate(
+        {
+            "overall_progress": progress,
+            "concept_stats": {
+                "not_started": status_counts.get(ProgressStatus.NOT_STARTED.value, 0),
+                "in_progress": status_counts.get(ProgressStatus.IN_PROGRESS.value, 0),
+                "completed": status_counts.get(ProgressStatus.COMPLETED.value, 0),
+                "mastered": status_counts.get(ProgressStatus.MASTERED.value, 0),
+            },
+            "recent_activity": recent_concepts.scalars().all()
         },
-        "recent_activity": recent_concepts.scalars().all()
-    }
+        from_attributes=True
+    ).model_dump(mode="json")
+    
+    await set_cached(cache_key, summary, settings.DASHBOARD_CACHE_TTL)
+    return summary
 
 
 @router.post("/concepts", response_model=ConceptProgressResponse)
@@ -138,17 +172,19 @@ async def create_concept_progress(
     
     if existing:
         # Update existing
-        for key, value in concept_progress.dict(exclude_unset=True).items():
+        for key, value in concept_progress.model_dump(exclude_unset=True).items():
             setattr(existing, key, value)
         db_concept = existing
     else:
         # Create new
-        db_concept = ConceptProgress(**concept_progress.dict())
+        db_concept = ConceptProgress(**concept_progress.model_dump())
         db.add(db_concept)
     
     try:
         await db.commit()
         await db.refresh(db_concept)
+        await invalidate_student("analytics", str(concept_progress.student_id))
+        await invalidate_student("dashboard", str(concept_progress.student_id))
         logger.info(
             "Concept progress updated",
             student_id=str(concept_progress.student_id),
@@ -168,10 +204,13 @@ async def get_concept_progress(
     subject: Optional[str] = Query(None),
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0),
-    current_user: dict = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user: dict = Depends(get_current_user)
 ):
-    """Get concept progress for a student."""
+    """Get concept progress for a student.
+    
+    Rows are read through a server-side cursor and written out as they
+    arrive, so a large page is never held in memory whole.
+    """
     # Build query
     query = select(ConceptProgress).where(ConceptProgress.student_id == student_id)
     
@@ -179,12 +218,30 @@ async def get_concept_progress(
         query = query.where(ConceptProgress.status == status.value)
     
     if subject:
-        query = query.where(ConceptProgress.metadata["subject"].astext == subject)
+        query = query.where(ConceptProgress.subject == subject)
     
     query = query.offset(offset).limit(limit).order_by(ConceptProgress.last_attempted_at.desc())
     
-    result = await db.execute(query)
-    return result.scalars().all()
+    return StreamingResponse(_stream_concept_progress(query), media_type="application/json")
+
+
+async def _stream_concept_progress(query) -> AsyncIterator[bytes]:
+    """Stream concept progress rows as a JSON array.
+    
+    Uses its own session: the request session is closed once the handler
+    returns, before the response body is sent.
+    """
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(query.execution_options(yield_per=CONCEPT_STREAM_CHUNK_SIZE))
+        
+        separator = b"["
+        async for concept in result.scalars():
+            item = ConceptProgressResponse.model_validate(concept).model_dump(mode="json")
+            yield separator + orjson.dumps(item)
+            separator = b","
+        
+        # An empty result never emitted the opening bracket
+        yield b"[]" if separator == b"[" else b"]"
 
 
 @router.put("/concepts/{concept_progress_id}", response_model=ConceptProgressResponse)
@@ -204,7 +261,7 @@ async def update_concept_progress(
         raise HTTPException(status_code=404, detail="Concept progress not found")
     
     # Update fields
-    update_data = update.dict(exclude_unset=True)
+    update_data = update.model_dump(exclude_unset=True)
     
     # Handle status transitions
     if "status" in update_data:
@@ -227,6 +284,8 @@ async def update_concept_progress(
     try:
         await db.commit()
         await db.refresh(concept_progress)
+        await invalidate_student("analytics", str(concept_progress.student_id))
+        await invalidate_student("dashboard", str(concept_progress.student_id))
         return concept_progress
     except Exception as e:
         logger.error("Failed to update concept progress", error=str(e))
@@ -241,45 +300,50 @@ async def bulk_update_progress(
     db: AsyncSession = Depends(get_db)
 ):
     """Bulk update multiple concept progress records."""
-    updated_count = 0
-    errors = []
-    
+    # Merge repeated (student, concept) pairs so each row is written once;
+    # later updates win for the fields they set
+    rows: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    fields_set: Dict[Tuple[str, str], Set[str]] = {}
     for update in updates.updates:
-        try:
-            # Find existing progress
-            result = await db.execute(
-                select(ConceptProgress).where(
-                    and_(
-                        ConceptProgress.student_id == update.student_id,
-                        ConceptProgress.concept_id == update.concept_id
-                    )
-                )
-            )
-            progress = result.scalar_one_or_none()
-            
-            if progress:
-                # Update existing
-                for key, value in update.dict(exclude={"student_id", "concept_id"}, exclude_unset=True).items():
-                    setattr(progress, key, value)
-            else:
-                # Create new
-                progress = ConceptProgress(**update.dict())
-                db.add(progress)
-            
-            updated_count += 1
-            
-        except Exception as e:
-            errors.append({
-                "student_id": str(update.student_id),
-                "concept_id": str(update.concept_id),
-                "error": str(e)
-            })
+        key = (str(update.student_id), str(update.concept_id))
+        # Dump once; the set fields are read off model_fields_set
+        row = update.model_dump()
+        fields = update.model_fields_set
+        if key in rows:
+            rows[key].update({field: row[field] for field in fields})
+            fields_set[key].update(fields)
+        else:
+            rows[key] = row
+            fields_set[key] = set(fields)
+    
+    # New rows are inserted whole; existing rows only take the fields each
+    # update set. One upsert per distinct field set, usually just one.
+    groups: Dict[FrozenSet[str], List[Dict[str, Any]]] = defaultdict(list)
+    for key, row in rows.items():
+        groups[frozenset(fields_set[key] - {"student_id", "concept_id"})].append(row)
     
     try:
+        for fields, group in groups.items():
+            columns = [ConceptProgress.__mapper__.columns[field].name for field in fields]
+            # Chunked to stay under the driver's bind parameter limit
+            for start in range(0, len(group), BULK_UPSERT_CHUNK_SIZE):
+                stmt = pg_insert(ConceptProgress).values(group[start:start + BULK_UPSERT_CHUNK_SIZE])
+                if columns:
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=["student_id", "concept_id"],
+                        set_={column: stmt.excluded[column] for column in columns}
+                    )
+                else:
+                    stmt = stmt.on_conflict_do_nothing(index_elements=["student_id", "concept_id"])
+                await db.execute(stmt)
+        
         await db.commit()
+        for student_id in {student_id for student_id, _ in rows}:
+            await invalidate_student("analytics", student_id)
+            await invalidate_student("dashboard", student_id)
+        # All-or-nothing: a failure rolls back below, so there are no per-item errors
         return {
-            "updated_count": updated_count,
-            "errors": errors
+            "updated_count": len(rows)
         }
     except Exception as e:
         logger.error("Bulk update failed", error=str(e))
@@ -296,6 +360,11 @@ async def get_leaderboard(
     db: AsyncSession = Depends(get_db)
 ):
     """Get progress leaderboard."""
+    cache_key = make_cache_key("leaderboard", "progress", timeframe, subject, limit)
+    cached = await get_cached(cache_key)
+    if cached is not None:
+        return cached
+    
     # Build date filter based on timeframe
     date_filter = None
     if timeframe == "daily":
@@ -320,14 +389,16 @@ async def get_leaderboard(
     
     result = await db.execute(query)
     
-    leaderboard = []
-    for row in result:
-        leaderboard.append({
+    leaderboard = [
+        {
             "student_id": str(row.student_id),
             "concepts_mastered": row.total_concepts_mastered,
             "level": row.current_level,
             "time_spent": row.time_spent,
-            "rank": len(leaderboard) + 1
-        })
+            "rank": rank
+        }
+        for rank, row in enumerate(result, start=1)
+    ]
     
+    await set_cached(cache_key, leaderboard, settings.LEADERBOARD_CACHE_TTL)
     return leaderboard
\ No newline at end of file